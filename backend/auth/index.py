@@ -4,10 +4,56 @@ import hashlib
 import jwt
 from datetime import datetime, timedelta
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from cache import LRUCache, ProfileCache, make_shared_cache
+from db import CONSISTENCY_HEADER, connect, run_request, parse_consistency_token
+from tokens import read_auth_token, verify_token
+from responses import compress_response
+from ratelimit import RateLimiter, make_shared_buckets, client_ip
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+profile_cache = ProfileCache(
+    int(os.environ.get('PROFILE_CACHE_SIZE', '1000')),
+    float(os.environ.get('PROFILE_CACHE_TTL', '30')),
+    float(os.environ.get('PROFILE_SHARED_CACHE_TTL', '3600')),
+    make_shared_cache()
+)
+
+# (capacity, period seconds) per client IP, override with RATE_LIMITS="login=10/300,..."
+rate_limiter = RateLimiter({
+    'register': (5, 3600),
+    'login': (10, 300)
+}, make_shared_buckets())
+
+# counters maintained by collections, playlists and moderation in their write transactions
+USER_STATS_COLUMNS = ('reviews_count', 'approved_reviews_count', 'playlists_count', 'saved_playlists_count', 'collection_count')
+
+# kept beside the local profile tier with the same bound and TTL, so a warm profile GET needs no connection
+user_stats_cache = LRUCache(
+    int(os.environ.get('PROFILE_CACHE_SIZE', '1000')),
+    float(os.environ.get('PROFILE_CACHE_TTL', '30'))
+)
+
+
+def load_user_stats(get_cursor, user_id: int, recent_write: bool = False) -> Dict[str, int]:
+    '''
+    Profile counters from the single user_stats row, zeros for users without activity yet
+    Args: get_cursor - opens the connection only on a cache miss; recent_write - the caller holds a fresh consistency token, skip the cache
+    '''
+    key = f'stats:{int(user_id)}'
+    stats = None if recent_write else user_stats_cache.get(key)
+    if stats is None:
+        cursor = get_cursor()
+        cursor.execute(
+            f"SELECT {', '.join(USER_STATS_COLUMNS)} FROM user_stats WHERE user_id = %s",
+            (user_id,)
+        )
+        row = cursor.fetchone()
+        stats = {column: row[column] if row else 0 for column in USER_STATS_COLUMNS}
+        user_stats_cache.set(key, stats)
+    return stats
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: User authentication, registration and profile management
     Args: event - dict with httpMethod, body, headers
@@ -22,7 +68,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -42,7 +88,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     if method == 'GET':
         headers = event.get('headers', {})
-        token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+        token = read_auth_token(headers)
         
         if not token:
             return {
@@ -53,7 +99,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         try:
-            decoded = jwt.decode(token, jwt_secret, algorithms=['HS256'])
+            decoded = verify_token(token, jwt_secret)
             user_id = decoded['user_id']
         except:
             return {
@@ -63,25 +109,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(db_url)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        db: Dict[str, Any] = {}
+        
+        def get_cursor():
+            if 'cursor' not in db:
+                db['conn'] = connect(db_url, headers, read_only=True)
+                db['cursor'] = db['conn'].cursor(cursor_factory=RealDictCursor)
+            return db['cursor']
         
         try:
             query_params = event.get('queryStringParameters') or {}
-            target_user_id = query_params.get('user_id')
+            target_user_id = query_params.get('user_id') or user_id
             
-            if target_user_id:
-                cursor.execute(
-                    "SELECT id, username, email, role, avatar_url, age, bio, status, created_at FROM users WHERE id = %s",
-                    (target_user_id,)
-                )
-            else:
-                cursor.execute(
-                    "SELECT id, username, email, role, avatar_url, age, bio, status, created_at FROM users WHERE id = %s",
-                    (user_id,)
-                )
+            recent_write = parse_consistency_token(headers.get(CONSISTENCY_HEADER) or headers.get(CONSISTENCY_HEADER.lower()))
             
-            user = cursor.fetchone()
+            user = None
+            if str(target_user_id).isdigit():
+                user = profile_cache.get_many(get_cursor, [target_user_id]).get(int(target_user_id))
             
             if not user:
                 return {
@@ -103,17 +147,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'age': user['age'],
                     'bio': user['bio'],
                     'status': user['status'],
-                    'created_at': user['created_at'].isoformat() if user['created_at'] else None
+                    'created_at': user['created_at'],
+                    'stats': load_user_stats(get_cursor, user['id'], recent_write is not None)
                 }),
                 'isBase64Encoded': False
             }
         finally:
-            cursor.close()
-            conn.close()
+            if 'cursor' in db:
+                db['cursor'].close()
+                db['conn'].close()
     
     if method == 'PUT':
         headers = event.get('headers', {})
-        token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+        token = read_auth_token(headers)
         
         if not token:
             return {
@@ -124,7 +170,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         try:
-            decoded = jwt.decode(token, jwt_secret, algorithms=['HS256'])
+            decoded = verify_token(token, jwt_secret)
             user_id = decoded['user_id']
         except:
             return {
@@ -150,7 +196,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(db_url)
+        conn = connect(db_url)
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         try:
@@ -201,10 +247,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             update_fields.append("updated_at = CURRENT_TIMESTAMP")
             update_values.append(user_id)
             
-            query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = %s RETURNING id, username, email, avatar_url, age, bio, status, created_at"
+            query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = %s RETURNING id, username, email, role, avatar_url, age, bio, status, created_at"
             cursor.execute(query, update_values)
             user = cursor.fetchone()
+            
+            if username:
+                cursor.execute(
+                    "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'playlist_feed'"
+                )
+            
             conn.commit()
+            profile_cache.put(user)
             
             return {
                 'statusCode': 200,
@@ -247,7 +300,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(db_url)
+    if action in ('register', 'login'):
+        limited = rate_limiter.check(action, client_ip(event))
+        if limited:
+            return limited
+    
+    conn = connect(db_url)
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -278,7 +336,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
             cursor.execute(
-                "INSERT INTO users (email, password_hash, username) VALUES (%s, %s, %s) RETURNING id, email, username, created_at",
+                "INSERT INTO users (email, password_hash, username) VALUES (%s, %s, %s) RETURNING id, email, username, role, perm_epoch, created_at",
                 (email, password_hash, username)
             )
             user = cursor.fetchone()
@@ -287,6 +345,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             token = jwt.encode({
                 'user_id': user['id'],
                 'email': user['email'],
+                'role': user['role'] or 'user',
+                'perm_epoch': user['perm_epoch'],
                 'exp': datetime.utcnow() + timedelta(days=30)
             }, jwt_secret, algorithm='HS256')
             
@@ -319,7 +379,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
             cursor.execute(
-                "SELECT id, email, username, role FROM users WHERE email = %s AND password_hash = %s",
+                "SELECT id, email, username, role, perm_epoch FROM users WHERE email = %s AND password_hash = %s",
                 (email, password_hash)
             )
             user = cursor.fetchone()
@@ -335,6 +395,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             token = jwt.encode({
                 'user_id': user['id'],
                 'email': user['email'],
+                'role': user['role'] or 'user',
+                'perm_epoch': user['perm_epoch'],
                 'exp': datetime.utcnow() + timedelta(days=30)
             }, jwt_secret, algorithm='HS256')
             
@@ -363,4 +425,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
\ No newline at end of file
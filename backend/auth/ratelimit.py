@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+RATE_LIMIT_KEYS = int(os.environ.get('RATE_LIMIT_KEYS', '10000'))
+
+# KEYS[1] bucket; ARGV capacity, refill per second. Redis clock so every instance agrees on elapsed time
+TAKE_SCRIPT = '''
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+'''
+
+
+def refill(tokens: float, updated_at: float, now: float, capacity: int, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+class LocalBuckets:
+    '''
+    Token buckets in process memory, LRU-bounded; also the local:// stand-in for the shared tier
+    '''
+
+    def __init__(self, max_keys: int = RATE_LIMIT_KEYS):
+        self.max_keys = max_keys
+        self.buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float) -> Tuple[bool, float]:
+        '''
+        Returns: (allowed, tokens left after this request)
+        '''
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.get(key, (capacity, now))
+            tokens = refill(tokens, updated_at, now, capacity, rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return allowed, tokens
+
+
+class RedisBuckets:
+    '''
+    Shared tier: one atomic Lua script call per request
+    '''
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: int, rate: float) -> Tuple[bool, float]:
+        allowed, tokens = self.script(keys=[key], args=[capacity, rate])
+        return bool(allowed), float(tokens)
+
+
+def make_shared_buckets(url: Optional[str] = None):
+    '''
+    Build the optional shared tier from RATE_LIMIT_SHARED_URL: local:// for the stand-in, redis:// for Redis
+    Returns: None when not configured or the redis package is missing
+    '''
+    url = url if url is not None else os.environ.get('RATE_LIMIT_SHARED_URL', '')
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return LocalBuckets()
+    if redis is None:
+        return None
+    return RedisBuckets(url)
+
+
+def parse_policies(spec: str) -> Dict[str, Tuple[int, float]]:
+    '''
+    RATE_LIMITS="review_create=5/60,login=10/60" -> {name: (capacity, period seconds)}
+    '''
+    policies = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        capacity, _, period = value.partition('/')
+        policies[name.strip()] = (int(capacity), float(period or 60))
+    return policies
+
+
+class RateLimiter:
+    '''
+    Per-endpoint token buckets keyed by user id or client IP
+    Args: policies - {name: (capacity, period seconds)}, refilled evenly, overridable via RATE_LIMITS; shared - optional tier
+    The in-process tier answers first, so a client already over its limit never costs a shared round trip
+    '''
+
+    def __init__(self, policies: Dict[str, Tuple[int, float]], shared=None):
+        self.policies = {**policies, **parse_policies(os.environ.get('RATE_LIMITS', ''))}
+        self.local = LocalBuckets()
+        self.shared = shared
+        self.metrics = {'allowed': 0, 'limited': 0, 'shared_errors': 0}
+
+    def check(self, policy: str, subject: Any) -> Optional[Dict[str, Any]]:
+        '''
+        Returns: None when allowed, otherwise a ready 429 response with Retry-After and X-RateLimit-* headers
+        '''
+        capacity, period = self.policies[policy]
+        rate = capacity / period
+        key = f'rl:{policy}:{subject}'
+
+        allowed, tokens = self.local.take(key, capacity, rate)
+        if allowed and self.shared is not None:
+            try:
+                allowed, tokens = self.shared.take(key, capacity, rate)
+            except Exception:
+                self.metrics['shared_errors'] += 1
+
+        if allowed:
+            self.metrics['allowed'] += 1
+            return None
+
+        self.metrics['limited'] += 1
+        return {
+            'statusCode': 429,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'Retry-After, X-RateLimit-Limit, X-RateLimit-Remaining',
+                'Content-Type': 'application/json',
+                'Retry-After': str(max(1, math.ceil((1 - tokens) / rate))),
+                'X-RateLimit-Limit': f'{capacity};w={int(period)}',
+                'X-RateLimit-Remaining': '0'
+            },
+            'body': json.dumps({'error': 'Слишком много запросов, попробуйте позже'}),
+            'isBase64Encoded': False
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, 'local_keys': len(self.local.buckets), 'shared': self.shared is not None}
+
+
+def client_ip(event: Dict[str, Any]) -> str:
+    '''
+    Source IP the platform saw, X-Forwarded-For only when it is missing (e.g. behind a local proxy)
+    '''
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers') or {}
+    forwarded = headers.get('X-Forwarded-For') or headers.get('x-forwarded-for')
+    return forwarded.split(',')[0].strip() if forwarded else 'unknown'
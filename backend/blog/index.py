@@ -0,0 +1,267 @@
+import json
+import os
+import base64
+import binascii
+import jwt
+from typing import Dict, Any, Optional
+from psycopg2.extras import RealDictCursor
+from db import connect, run_request, execute_prepared
+from tokens import read_auth_token, verify_token
+from responses import compress_response
+from snapshots import BLOG_PAGE_SIZE, render_page, scope_filter, set_published
+
+
+def list_scope(query_params: Dict[str, Any]) -> Optional[str]:
+    '''
+    Precomputed list scope for ?category / ?tag, None for the combination that has no prebuilt pages
+    '''
+    category, tag = query_params.get('category'), query_params.get('tag')
+    if category and tag:
+        return None
+    if category:
+        return f'category:{category}'
+    if tag:
+        return f'tag:{tag}'
+    return 'all'
+
+
+def keyset_page(cursor, query_params: Dict[str, Any]) -> Optional[str]:
+    '''
+    List page straight from the snapshot summaries, for cursors issued before the last rebuild and filter combinations
+    Returns: response body, None when the cursor is invalid
+    '''
+    conditions, params = scope_filter(query_params.get('category'), query_params.get('tag'))
+    if query_params.get('cursor'):
+        try:
+            after_published, after_id = json.loads(base64.urlsafe_b64decode(query_params['cursor'].encode('ascii')))
+            conditions.append('(published_at, post_id) < (%s::timestamp, %s)')
+            params.extend([str(after_published), int(after_id)])
+        except (ValueError, TypeError, binascii.Error):
+            return None
+    
+    cursor.execute(
+        f"""SELECT post_id, published_at, summary FROM blog_post_snapshots
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY published_at DESC, post_id DESC
+            LIMIT %s""",
+        params + [BLOG_PAGE_SIZE + 1]
+    )
+    return render_page(cursor.fetchall(), BLOG_PAGE_SIZE)
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Blog read API over precomputed snapshots, plus publishing for admins
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response with a post or a page of posts
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    db_url = os.environ.get('DATABASE_URL')
+    jwt_secret = os.environ.get('JWT_SECRET')
+    
+    if not db_url or not jwt_secret:
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Server configuration error'}),
+            'isBase64Encoded': False
+        }
+    
+    headers = event.get('headers', {})
+    
+    if method == 'GET':
+        query_params = event.get('queryStringParameters', {}) or {}
+        conn = connect(db_url, headers, read_only=True)
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        try:
+            if query_params.get('slug'):
+                execute_prepared(cursor, "SELECT body FROM blog_post_snapshots WHERE slug = %s", (query_params['slug'],))
+                post = cursor.fetchone()
+                
+                if not post:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Статья не найдена'}),
+                        'isBase64Encoded': False
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': post['body'],
+                    'isBase64Encoded': False
+                }
+            
+            body = None
+            scope = list_scope(query_params)
+            if scope is not None:
+                execute_prepared(
+                    cursor,
+                    "SELECT body FROM blog_list_pages WHERE scope = %s AND after_key = %s",
+                    (scope, query_params.get('cursor') or '')
+                )
+                page = cursor.fetchone()
+                body = page['body'] if page else None
+            
+            if body is None:
+                body = keyset_page(cursor, query_params)
+            
+            if body is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Недопустимый курсор'}),
+                    'isBase64Encoded': False
+                }
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': body,
+                'isBase64Encoded': False
+            }
+        
+        finally:
+            cursor.close()
+            conn.close()
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    auth_token = read_auth_token(headers)
+    
+    if not auth_token:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Требуется авторизация'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        payload = verify_token(auth_token, jwt_secret)
+        user_id = payload['user_id']
+    except jwt.ExpiredSignatureError:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Токен истёк'}),
+            'isBase64Encoded': False
+        }
+    except jwt.InvalidTokenError:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Неверный токен'}),
+            'isBase64Encoded': False
+        }
+    
+    body_data = json.loads(event.get('body', '{}'))
+    action = body_data.get('action')
+    
+    if action not in ('publish', 'unpublish'):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Неизвестное действие'}),
+            'isBase64Encoded': False
+        }
+    
+    if not body_data.get('post_id') and not body_data.get('slug'):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'post_id или slug обязателен'}),
+            'isBase64Encoded': False
+        }
+    
+    post_id = body_data.get('post_id')
+    if post_id is not None:
+        try:
+            post_id = int(post_id)
+        except (ValueError, TypeError):
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'post_id должен быть числом'}),
+                'isBase64Encoded': False
+            }
+    
+    conn = connect(db_url, headers)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    try:
+        execute_prepared(cursor, "SELECT role FROM users WHERE id = %s", (user_id,))
+        user = cursor.fetchone()
+        
+        if not user or user['role'] != 'admin':
+            return {
+                'statusCode': 403,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
+                'isBase64Encoded': False
+            }
+        
+        cursor.execute(
+            "SELECT id FROM blog_posts WHERE id = %s OR slug = %s",
+            (post_id, body_data.get('slug'))
+        )
+        post = cursor.fetchone()
+        
+        if not post:
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Статья не найдена'}),
+                'isBase64Encoded': False
+            }
+        
+        result = set_published(cursor, post['id'], action == 'publish')
+        conn.commit()
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({
+                'message': 'Статья опубликована' if action == 'publish' else 'Статья снята с публикации',
+                **result
+            }),
+            'isBase64Encoded': False
+        }
+    
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
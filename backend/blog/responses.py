@@ -0,0 +1,84 @@
+import base64
+import gzip
+import os
+from typing import Dict, Any, Optional, Set
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+
+def build_projection(fields_param: Optional[str], allowed: Dict[str, str], default: str) -> Optional[str]:
+    '''
+    Translate ?fields=a,b into a SELECT list from the endpoint whitelist
+    Returns: default projection when fields absent, None when any field is unknown
+    '''
+    if not fields_param:
+        return default
+
+    names = list(dict.fromkeys(f.strip() for f in fields_param.split(',') if f.strip()))
+    if not names or any(name not in allowed for name in names):
+        return None
+
+    return ', '.join(f"{allowed[name]} AS {name}" for name in names)
+
+
+def accepted_encodings(headers: Dict[str, Any]) -> Set[str]:
+    '''
+    Parse Accept-Encoding into the set of codings the client accepts (q > 0)
+    '''
+    accept = headers.get('Accept-Encoding') or headers.get('accept-encoding') or ''
+    codings = set()
+    for part in accept.lower().split(','):
+        name, _, params = part.partition(';')
+        quality = params.strip().replace(' ', '')
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name.strip():
+            codings.add(name.strip())
+    return codings
+
+
+def compress_response(headers: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Compress response body with brotli or gzip when it is above COMPRESSION_MIN_BYTES
+    Args: headers - request headers with Accept-Encoding
+          response - handler response dict
+    Returns: response with base64 compressed body, Content-Encoding and Vary headers
+    '''
+    body = response.get('body') or ''
+    raw = base64.b64decode(body) if response.get('isBase64Encoded') else body.encode('utf-8')
+
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return response
+
+    response_headers = dict(response.get('headers') or {})
+    vary = response_headers.get('Vary')
+    response_headers['Vary'] = f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'
+
+    codings = accepted_encodings(headers)
+    if brotli is not None and 'br' in codings:
+        encoding = 'br'
+        compressed = brotli.compress(raw, quality=BROTLI_QUALITY)
+    elif 'gzip' in codings:
+        encoding = 'gzip'
+        compressed = gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return {**response, 'headers': response_headers}
+
+    response_headers['Content-Encoding'] = encoding
+    return {
+        **response,
+        'headers': response_headers,
+        'body': base64.b64encode(compressed).decode('ascii'),
+        'isBase64Encoded': True
+    }
@@ -0,0 +1,190 @@
+import base64
+import json
+import os
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Set, Tuple
+from psycopg2.extras import RealDictCursor
+
+BLOG_PAGE_SIZE = int(os.environ.get('BLOG_PAGE_SIZE', '12'))
+
+# one advisory lock for every rebuild, concurrent publishes would otherwise race on the same list pages
+REBUILD_LOCK_KEY = 470047
+
+POST_SOURCE = """SELECT p.id, p.title, p.slug, p.excerpt, p.content, p.category, p.cover_image, p.tags,
+                        p.read_time, p.published_at, p.updated_at, p.author_id,
+                        u.username AS author_name, u.avatar_url AS author_avatar
+                 FROM blog_posts p
+                 LEFT JOIN users u ON u.id = p.author_id"""
+
+
+def encode_cursor(published_at: Any, post_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([published_at, post_id], default=str).encode('utf-8')).decode('ascii')
+
+
+def serialize_post(post: Dict[str, Any]) -> Tuple[str, str]:
+    '''
+    Returns: (summary JSON for list pages, full JSON with content for the post page)
+    '''
+    summary = {
+        'id': post['id'],
+        'title': post['title'],
+        'slug': post['slug'],
+        'excerpt': post['excerpt'],
+        'category': post['category'],
+        'cover_image': post['cover_image'],
+        'tags': post['tags'] or [],
+        'read_time': post['read_time'],
+        'published_at': post['published_at'],
+        'author': {'id': post['author_id'], 'username': post['author_name'], 'avatar_url': post['author_avatar']}
+    }
+    body = {**summary, 'content': post['content'], 'updated_at': post['updated_at']}
+    return json.dumps(summary, default=str, ensure_ascii=False), json.dumps(body, default=str, ensure_ascii=False)
+
+
+def post_scopes(category: Optional[str], tags: Optional[Iterable[str]]) -> Set[str]:
+    scopes = {'all'}
+    if category:
+        scopes.add(f'category:{category}')
+    scopes.update(f'tag:{tag}' for tag in tags or [])
+    return scopes
+
+
+def scope_filter(category: Optional[str], tag: Optional[str]) -> Tuple[List[str], List[Any]]:
+    conditions: List[str] = []
+    params: List[Any] = []
+    if category:
+        conditions.append('category = %s')
+        params.append(category)
+    if tag:
+        conditions.append('tags @> ARRAY[%s]::text[]')
+        params.append(tag)
+    return conditions, params
+
+
+def parse_scope(scope: str) -> Tuple[Optional[str], Optional[str]]:
+    kind, _, value = scope.partition(':')
+    return (value, None) if kind == 'category' else (None, value) if kind == 'tag' else (None, None)
+
+
+def render_page(rows: Sequence[Dict[str, Any]], page_size: int) -> str:
+    '''
+    List body from stored summaries without re-parsing them; rows carry one extra item to detect the next page
+    '''
+    page = rows[:page_size]
+    next_cursor = encode_cursor(page[-1]['published_at'], page[-1]['post_id']) if len(rows) > page_size else None
+    return f'{{"posts": [{", ".join(row["summary"] for row in page)}], "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+def rebuild_scope(cursor, scope: str, page_size: int = BLOG_PAGE_SIZE) -> int:
+    '''
+    Business: Replace every precomputed list page of one scope from the snapshot summaries
+    Returns: number of pages written
+    '''
+    conditions, params = scope_filter(*parse_scope(scope))
+    cursor.execute(
+        f"""SELECT post_id, published_at, summary FROM blog_post_snapshots
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY published_at DESC, post_id DESC""",
+        params
+    )
+    rows = cursor.fetchall()
+    cursor.execute("DELETE FROM blog_list_pages WHERE scope = %s", (scope,))
+    # an emptied category or tag keeps no pages, reads fall back to the (empty) keyset query
+    if not rows and scope != 'all':
+        return 0
+
+    pages = []
+    after_key = ''
+    for start in range(0, max(len(rows), 1), page_size):
+        pages.append((scope, after_key, render_page(rows[start:start + page_size + 1], page_size)))
+        last = rows[min(start + page_size, len(rows)) - 1] if rows else None
+        after_key = encode_cursor(last['published_at'], last['post_id']) if last else ''
+
+    cursor.executemany(
+        "INSERT INTO blog_list_pages (scope, after_key, body) VALUES (%s, %s, %s)",
+        pages
+    )
+    return len(pages)
+
+
+def snapshot_post(cursor, post_id: int) -> Set[str]:
+    '''
+    Business: Re-serialize one post into blog_post_snapshots, or drop its snapshot when it is not published
+    Returns: list scopes whose pages are now stale (old and new category and tags)
+    '''
+    cursor.execute("SELECT category, tags FROM blog_post_snapshots WHERE post_id = %s FOR UPDATE", (post_id,))
+    previous = cursor.fetchone()
+    scopes = post_scopes(previous['category'], previous['tags']) if previous else set()
+
+    cursor.execute(f"{POST_SOURCE} WHERE p.id = %s AND p.is_published = true", (post_id,))
+    post = cursor.fetchone()
+    if post is None:
+        cursor.execute("DELETE FROM blog_post_snapshots WHERE post_id = %s", (post_id,))
+        return scopes
+
+    summary, body = serialize_post(post)
+    cursor.execute(
+        """INSERT INTO blog_post_snapshots (post_id, slug, category, tags, published_at, summary, body)
+           VALUES (%s, %s, %s, %s, %s, %s, %s)
+           ON CONFLICT (post_id) DO UPDATE SET
+               slug = EXCLUDED.slug, category = EXCLUDED.category, tags = EXCLUDED.tags,
+               published_at = EXCLUDED.published_at, summary = EXCLUDED.summary, body = EXCLUDED.body,
+               built_at = CURRENT_TIMESTAMP""",
+        (post_id, post['slug'], post['category'], post['tags'] or [], post['published_at'], summary, body)
+    )
+    return scopes | post_scopes(post['category'], post['tags'])
+
+
+def set_published(cursor, post_id: int, published: bool) -> Dict[str, int]:
+    '''
+    Business: Publish or unpublish a post and refresh its snapshot and the affected list pages in the caller's transaction
+    Publishing an already published post re-snapshots it, which is how edits reach readers
+    Returns: {'scopes': scopes rebuilt, 'pages': pages written}
+    '''
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (REBUILD_LOCK_KEY,))
+    cursor.execute(
+        """UPDATE blog_posts
+           SET is_published = %s,
+               published_at = CASE WHEN %s THEN COALESCE(published_at, CURRENT_TIMESTAMP) ELSE published_at END,
+               updated_at = CURRENT_TIMESTAMP
+           WHERE id = %s""",
+        (published, published, post_id)
+    )
+    scopes = snapshot_post(cursor, post_id)
+    return {'scopes': len(scopes), 'pages': sum(rebuild_scope(cursor, scope) for scope in sorted(scopes))}
+
+
+def rebuild_all(conn) -> Dict[str, int]:
+    '''
+    Business: Re-snapshot every published post and rebuild every list page, e.g. after editing posts directly in the database
+    Returns: {'posts': snapshots written, 'scopes': scopes rebuilt, 'pages': pages written}
+    '''
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (REBUILD_LOCK_KEY,))
+        cursor.execute("SELECT post_id FROM blog_post_snapshots UNION SELECT id FROM blog_posts WHERE is_published = true")
+        scopes = set()
+        post_ids = [row['post_id'] for row in cursor.fetchall()]
+        for post_id in post_ids:
+            scopes |= snapshot_post(cursor, post_id)
+        cursor.execute("SELECT DISTINCT scope FROM blog_list_pages")
+        scopes |= {row['scope'] for row in cursor.fetchall()}
+        scopes.add('all')
+        pages = sum(rebuild_scope(cursor, scope) for scope in sorted(scopes))
+        conn.commit()
+        return {'posts': len(post_ids), 'scopes': len(scopes), 'pages': pages}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    # full rebuild: python backend/blog/snapshots.py
+    from db import connect_maintenance
+
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    try:
+        print(json.dumps(rebuild_all(conn)))
+    finally:
+        conn.close()
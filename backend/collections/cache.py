@@ -0,0 +1,358 @@
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LRUCache:
+    '''
+    Thread-safe in-process LRU with a per-entry TTL, lives as long as the warm instance
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class LocalSharedCache:
+    '''
+    In-memory stand-in for the shared tier with the same get/set/add/delete contract as RedisSharedCache
+    '''
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[float, str]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                return None
+            return json.loads(entry[1])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, json.dumps(value))
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return False
+            self.entries[key] = (time.monotonic() + ttl, json.dumps(value))
+            return True
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class RedisSharedCache:
+    '''
+    Shared tier backed by Redis, values stored as JSON
+    '''
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def add(self, key: str, value: Any, ttl: float) -> bool:
+        return bool(self.client.set(key, json.dumps(value), ex=max(1, int(ttl)), nx=True))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+
+def make_shared_cache(url: Optional[str] = None):
+    '''
+    Build the optional shared tier from CACHE_SHARED_URL: local:// for the stand-in, redis:// for Redis
+    Returns: None when not configured or the redis package is missing
+    '''
+    url = url if url is not None else os.environ.get('CACHE_SHARED_URL', '')
+    if not url:
+        return None
+    if url.startswith('local://'):
+        return LocalSharedCache()
+    if redis is None:
+        return None
+    return RedisSharedCache(url)
+
+
+class ReadThroughCache:
+    '''
+    Two-tier read-through cache (in-process LRU, optional shared tier) with single-flight loads
+    Args: name - key prefix; local_size, ttl - LRU bounds; shared - optional shared tier
+    '''
+
+    def __init__(self, name: str, local_size: int, ttl: float, shared=None, lock_wait: float = 1.0):
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(local_size, ttl)
+        self.shared = shared
+        self.lock_wait = lock_wait
+        self.flights: Dict[str, threading.Lock] = {}
+        self.flights_lock = threading.Lock()
+        self.metrics = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0, 'shared_errors': 0}
+
+    def flight_lock(self, key: str) -> threading.Lock:
+        with self.flights_lock:
+            return self.flights.setdefault(key, threading.Lock())
+
+    def shared_get(self, key: str) -> Any:
+        try:
+            return self.shared.get(key)
+        except Exception:
+            self.metrics['shared_errors'] += 1
+            return None
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        '''
+        Returns: (value, source) where source is 'local', 'shared' or 'miss'
+        '''
+        key = f'{self.name}:{key}'
+        value = self.local.get(key)
+        if value is not None:
+            self.metrics['local_hits'] += 1
+            return value, 'local'
+
+        flight = self.flight_lock(key)
+        try:
+            with flight:
+                value = self.local.get(key)
+                if value is not None:
+                    self.metrics['coalesced'] += 1
+                    return value, 'local'
+
+                if self.shared is not None:
+                    value = self.shared_get(key)
+                    if value is None and not self.acquire_shared_lease(key):
+                        value = self.wait_for_shared(key)
+                    if value is not None:
+                        self.metrics['shared_hits'] += 1
+                        self.local.set(key, value)
+                        return value, 'shared'
+
+                self.metrics['misses'] += 1
+                value = loader()
+                self.local.set(key, value)
+                if self.shared is not None:
+                    try:
+                        self.shared.set(key, value, self.ttl)
+                        self.shared.delete(f'{key}:lease')
+                    except Exception:
+                        self.metrics['shared_errors'] += 1
+                return value, 'miss'
+        finally:
+            # waiters still hold the lock object; later callers find the value in the LRU or start a new flight
+            with self.flights_lock:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+
+    def acquire_shared_lease(self, key: str) -> bool:
+        try:
+            return self.shared.add(f'{key}:lease', 1, max(self.lock_wait * 5, 1))
+        except Exception:
+            self.metrics['shared_errors'] += 1
+            return True
+
+    def wait_for_shared(self, key: str) -> Any:
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = self.shared_get(key)
+            if value is not None:
+                self.metrics['coalesced'] += 1
+                return value
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, 'local_entries': len(self.local), 'flights': len(self.flights), 'shared': self.shared is not None}
+
+
+PROFILE_COLUMNS = 'id, username, email, role, avatar_url, age, bio, status, created_at'
+
+
+class ProfileCache:
+    '''
+    User profiles by id: in-process LRU, optional shared tier, misses filled with one = ANY(%s) query
+    Args: local_size - LRU bound; local_ttl, shared_ttl - seconds; shared - optional shared tier
+    '''
+
+    def __init__(self, local_size: int, local_ttl: float, shared_ttl: float, shared=None):
+        self.local = LRUCache(local_size, local_ttl)
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.metrics = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'db_batches': 0, 'shared_errors': 0}
+
+    @staticmethod
+    def key(user_id: Any) -> str:
+        return f'profile:{int(user_id)}'
+
+    @staticmethod
+    def serialize(row: Dict[str, Any]) -> Dict[str, Any]:
+        profile = dict(row)
+        if profile.get('created_at') is not None and not isinstance(profile['created_at'], str):
+            profile['created_at'] = profile['created_at'].isoformat()
+        return profile
+
+    def get_many(self, get_cursor: Callable[[], Any], user_ids) -> Dict[int, Dict[str, Any]]:
+        '''
+        Returns: {user_id: profile} for ids that exist, fetching all misses in one query
+        '''
+        found: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for user_id in {int(u) for u in user_ids if u is not None}:
+            profile = self.local.get(self.key(user_id))
+            if profile is not None:
+                self.metrics['local_hits'] += 1
+                found[user_id] = profile
+            else:
+                missing.append(user_id)
+
+        if missing and self.shared is not None:
+            still_missing = []
+            for user_id in missing:
+                try:
+                    profile = self.shared.get(self.key(user_id))
+                except Exception:
+                    self.metrics['shared_errors'] += 1
+                    profile = None
+                if profile is not None:
+                    self.metrics['shared_hits'] += 1
+                    self.local.set(self.key(user_id), profile)
+                    found[user_id] = profile
+                else:
+                    still_missing.append(user_id)
+            missing = still_missing
+
+        if missing:
+            self.metrics['misses'] += len(missing)
+            self.metrics['db_batches'] += 1
+            cursor = get_cursor()
+            cursor.execute(f"SELECT {PROFILE_COLUMNS} FROM users WHERE id = ANY(%s)", (missing,))
+            for row in cursor.fetchall():
+                profile = self.put(row)
+                found[profile['id']] = profile
+
+        return found
+
+    def put(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        '''
+        Write-through a fresh users row to both tiers
+        '''
+        profile = self.serialize(row)
+        self.local.set(self.key(profile['id']), profile)
+        if self.shared is not None:
+            try:
+                self.shared.set(self.key(profile['id']), profile, self.shared_ttl)
+            except Exception:
+                self.metrics['shared_errors'] += 1
+        return profile
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, 'local_entries': len(self.local), 'shared': self.shared is not None}
+
+
+class MembershipCache:
+    '''
+    Per-user sorted array of collected movie ids, so repeated grid renders are answered by bisect without the database
+    Args: max_users - LRU bound; ttl - seconds, 0 disables the cache; max_items - larger collections are never loaded
+    Writes on this instance invalidate the user, other instances catch up within ttl
+    '''
+
+    def __init__(self, max_users: int, ttl: float, max_items: int):
+        self.local = LRUCache(max_users, ttl)
+        self.enabled = ttl > 0
+        self.max_items = max_items
+        self.metrics = {'hits': 0, 'misses': 0, 'too_large': 0, 'invalidations': 0}
+
+    @staticmethod
+    def key(user_id: Any) -> str:
+        return f'membership:{int(user_id)}'
+
+    def members(self, get_cursor: Callable[[], Any], user_id: int) -> Optional[array]:
+        '''
+        Returns: the user's movie ids sorted, None when the cache is off or the collection is over max_items
+        '''
+        if not self.enabled:
+            return None
+        members = self.local.get(self.key(user_id))
+        if members is not None:
+            self.metrics['hits'] += 1
+            return None if members is False else members
+
+        self.metrics['misses'] += 1
+        cursor = get_cursor()
+        cursor.execute(
+            "SELECT movie_id FROM user_collections WHERE user_id = %s ORDER BY movie_id LIMIT %s",
+            (user_id, self.max_items + 1)
+        )
+        rows = cursor.fetchall()
+        if len(rows) > self.max_items:
+            # remembered as False so an oversized collection isn't reloaded on every request
+            self.metrics['too_large'] += 1
+            self.local.set(self.key(user_id), False)
+            return None
+        members = array('i', (row['movie_id'] for row in rows))
+        self.local.set(self.key(user_id), members)
+        return members
+
+    @staticmethod
+    def intersect(members: array, movie_ids: List[int]) -> List[int]:
+        found = []
+        for movie_id in movie_ids:
+            index = bisect_left(members, movie_id)
+            if index < len(members) and members[index] == movie_id:
+                found.append(movie_id)
+        return found
+
+    def invalidate(self, user_id: int) -> None:
+        self.metrics['invalidations'] += 1
+        self.local.delete(self.key(user_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, 'local_entries': len(self.local), 'enabled': self.enabled}
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, List, Optional
+import psycopg2
+
+COLLECTION_IMPORT_MAX_ROWS = int(os.environ.get('COLLECTION_IMPORT_MAX_ROWS', '20000'))
+IMPORT_ERROR_SAMPLES = 20
+
+IMPORT_COLUMNS = ('movie_id', 'movie_title', 'movie_genre', 'movie_rating', 'movie_image', 'movie_description')
+
+# headers exported by other services map onto our columns
+COLUMN_ALIASES = {
+    'id': 'movie_id',
+    'title': 'movie_title',
+    'name': 'movie_title',
+    'genre': 'movie_genre',
+    'rating': 'movie_rating',
+    'image': 'movie_image',
+    'poster': 'movie_image',
+    'description': 'movie_description'
+}
+
+COLUMN_LIMITS = {'movie_title': 255, 'movie_genre': 100, 'movie_image': 500}
+
+
+class CsvCopySource:
+    '''
+    File-like source for cursor.copy_expert: pulls CSV rows lazily, validates them and re-emits COPY csv lines
+    Only the current chunk is held in memory; rejected rows are counted and sampled with their line numbers
+    '''
+
+    def __init__(self, rows: Any, header: List[str], max_rows: int):
+        names = [COLUMN_ALIASES.get(name, name) for name in (h.strip().lower() for h in header)]
+        if 'movie_id' not in names or 'movie_title' not in names:
+            raise ValueError('В CSV нужны колонки movie_id и movie_title')
+        self.positions = {column: names.index(column) for column in IMPORT_COLUMNS if column in names}
+        self.rows = rows
+        self.max_rows = max_rows
+        self.pending = ''
+        self.out = io.StringIO()
+        self.writer = csv.writer(self.out, lineterminator='\n')
+        self.metrics = {'received': 0, 'staged': 0, 'skipped': 0}
+        self.errors: List[Dict[str, Any]] = []
+        self.failure: Optional[Exception] = None
+
+    def clean(self, row: List[str]) -> List[Optional[str]]:
+        values = {column: (row[i].strip() if i < len(row) else '') or None for column, i in self.positions.items()}
+        if values.get('movie_id') is None or not values['movie_id'].isdigit() or not 0 < int(values['movie_id']) <= 2 ** 31 - 1:
+            raise ValueError('movie_id должен быть положительным целым')
+        if values.get('movie_title') is None:
+            raise ValueError('movie_title обязателен')
+        if any('\x00' in value for value in values.values() if value):
+            raise ValueError('Недопустимый символ в строке')
+        for column, limit in COLUMN_LIMITS.items():
+            if values.get(column) and len(values[column]) > limit:
+                raise ValueError(f'{column} длиннее {limit} символов')
+        if values.get('movie_rating') is not None:
+            try:
+                rating = Decimal(values['movie_rating'].replace(',', '.'))
+            except InvalidOperation:
+                raise ValueError('movie_rating должен быть числом')
+            if not rating.is_finite():
+                raise ValueError('movie_rating должен быть числом')
+            try:
+                # quantize first: 9.95 rounds to 10.0, which DECIMAL(2,1) cannot hold
+                rating = rating.quantize(Decimal('0.1'))
+                in_range = Decimal('0') <= rating <= Decimal('9.9')
+            except ArithmeticError:
+                in_range = False
+            if not in_range:
+                raise ValueError('movie_rating должен быть от 0 до 9.9')
+            values['movie_rating'] = str(rating)
+        return [values.get(column) for column in IMPORT_COLUMNS]
+
+    def next_row(self) -> Optional[List[str]]:
+        try:
+            return next(self.rows, None)
+        except csv.Error as e:
+            # malformed quoting or an oversized field: the reader can't resync, so the whole file is rejected
+            raise ValueError(f'Строка {self.rows.line_num}: некорректный CSV ({e})') from None
+
+    def fill(self, size: int) -> None:
+        while True:
+            row = self.next_row()
+            if row is None:
+                break
+            if not any(cell.strip() for cell in row):
+                continue
+            self.metrics['received'] += 1
+            if self.metrics['received'] > self.max_rows:
+                raise ValueError(f'Не больше {self.max_rows} строк за один импорт')
+            try:
+                values = self.clean(row)
+            except ValueError as e:
+                self.metrics['skipped'] += 1
+                if len(self.errors) < IMPORT_ERROR_SAMPLES:
+                    self.errors.append({'line': self.rows.line_num, 'error': str(e)})
+                continue
+            self.metrics['staged'] += 1
+            self.writer.writerow([self.metrics['received']] + values)
+            if size >= 0 and self.out.tell() >= size:
+                break
+        self.pending += self.out.getvalue()
+        self.out.seek(0)
+        self.out.truncate()
+
+    def read(self, size: int = -1) -> str:
+        if size < 0 or len(self.pending) < size:
+            try:
+                self.fill(size - len(self.pending) if size >= 0 else -1)
+            except Exception as e:
+                # psycopg2 reports any exception raised here as a canceled COPY, keep the original for the caller
+                self.failure = self.failure or e
+                raise
+        if size < 0:
+            chunk, self.pending = self.pending, ''
+        else:
+            chunk, self.pending = self.pending[:size], self.pending[size:]
+        return chunk
+
+
+def import_collection(conn, user_id: int, text: str, max_rows: int = COLLECTION_IMPORT_MAX_ROWS) -> Dict[str, Any]:
+    '''
+    Business: Import a CSV watch-list into the user's collection in one transaction
+    Rows are streamed into a temp table with COPY, then merged by one INSERT … ON CONFLICT (user_id, movie_id) DO NOTHING;
+    a movie repeated in the file keeps its first row
+    Args: text - CSV with a header row naming at least movie_id and movie_title
+    Returns: {'received', 'imported', 'duplicates', 'skipped', 'errors'}; raises ValueError for a bad header, malformed CSV or too many rows
+    The caller commits, so the counters and caches can be updated in the same transaction
+    '''
+    rows = csv.reader(io.StringIO(text.lstrip('\ufeff')))
+    try:
+        header = next(rows, None)
+    except csv.Error as e:
+        raise ValueError(f'Строка {rows.line_num}: некорректный CSV ({e})') from None
+    if not header:
+        raise ValueError('Пустой CSV')
+    source = CsvCopySource(rows, header, max_rows)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """CREATE TEMP TABLE collection_import (
+                   line INTEGER NOT NULL,
+                   movie_id INTEGER NOT NULL,
+                   movie_title VARCHAR(255) NOT NULL,
+                   movie_genre VARCHAR(100),
+                   movie_rating DECIMAL(2,1),
+                   movie_image VARCHAR(500),
+                   movie_description TEXT
+               ) ON COMMIT DROP"""
+        )
+        try:
+            cursor.copy_expert(
+                f"COPY collection_import (line, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                source
+            )
+        except psycopg2.Error as e:
+            if source.failure is not None:
+                raise source.failure from None
+            if isinstance(e, psycopg2.DataError):
+                # a value clean() let through but the column rejected: bad input, not a database failure
+                raise ValueError('Файл содержит значения, которые нельзя сохранить') from None
+            raise
+        cursor.execute(
+            f"""INSERT INTO user_collections (user_id, {', '.join(IMPORT_COLUMNS)})
+                SELECT DISTINCT ON (movie_id) %s, {', '.join(IMPORT_COLUMNS)}
+                FROM collection_import
+                ORDER BY movie_id, line
+                ON CONFLICT (user_id, movie_id) DO NOTHING""",
+            (user_id,)
+        )
+        imported = cursor.rowcount
+    finally:
+        cursor.close()
+
+    return {
+        'received': source.metrics['received'],
+        'imported': imported,
+        'duplicates': source.metrics['staged'] - imported,
+        'skipped': source.metrics['skipped'],
+        'errors': source.errors
+    }
+
+
+if __name__ == '__main__':
+    # one-off import: python backend/collections/csv_import.py <user_id> <file.csv>
+    import sys
+    import time
+    from db import connect_maintenance
+    from stats import bump_stats
+
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    try:
+        with open(sys.argv[2], encoding='utf-8') as f:
+            started = time.perf_counter()
+            result = import_collection(conn, int(sys.argv[1]), f.read())
+        bump_stats(conn.cursor(), int(sys.argv[1]), collection_count=result['imported'])
+        conn.commit()
+        print(json.dumps({**result, 'seconds': round(time.perf_counter() - started, 3)}, ensure_ascii=False))
+    finally:
+        conn.close()
@@ -1,11 +1,256 @@
 import json
 import os
+import base64
 import jwt
-from typing import Dict, Any
-import psycopg2
+from typing import Dict, Any, List, Optional, Tuple
 from psycopg2.extras import RealDictCursor
+from cache import MembershipCache, ProfileCache, make_shared_cache
+from db import CONSISTENCY_HEADER, connect, run_request, execute_prepared, parse_consistency_token
+from tokens import read_auth_token, verify_token
+from responses import build_projection, compress_response
+from ratelimit import RateLimiter, make_shared_buckets
+from stats import bump_stats
+from csv_import import import_collection
+from paging import collection_page, collection_page_query
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COLUMNAR_MEDIA_TYPE = 'application/vnd.columnar+json'
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+
+profile_cache = ProfileCache(
+    int(os.environ.get('PROFILE_CACHE_SIZE', '1000')),
+    float(os.environ.get('PROFILE_CACHE_TTL', '30')),
+    float(os.environ.get('PROFILE_SHARED_CACHE_TTL', '3600')),
+    make_shared_cache()
+)
+
+MEMBERSHIP_MAX_IDS = 200
+membership_cache = MembershipCache(
+    int(os.environ.get('MEMBERSHIP_CACHE_USERS', '1000')),
+    float(os.environ.get('MEMBERSHIP_CACHE_TTL', '0')),
+    int(os.environ.get('MEMBERSHIP_CACHE_MAX_ITEMS', '20000'))
+)
+
+# (capacity, period seconds) per user, override with RATE_LIMITS="review_create=5/600"
+rate_limiter = RateLimiter({'review_create': (5, 600), 'collection_import': (5, 3600)}, make_shared_buckets())
+
+
+def negotiate_format(headers: Dict[str, Any], query_params: Dict[str, Any]) -> str:
+    '''
+    Pick wire format for list responses from ?format= or Accept header
+    Returns: 'json' (default), 'columnar' or 'msgpack' (columnar rows packed with MessagePack)
+    '''
+    requested = (query_params.get('format') or '').lower()
+    if not requested:
+        accept = headers.get('Accept') or headers.get('accept') or ''
+        if MSGPACK_MEDIA_TYPE in accept:
+            requested = 'msgpack'
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            requested = 'columnar'
+    
+    if requested == 'msgpack' and msgpack is None:
+        requested = 'columnar'
+    
+    return requested if requested in ('columnar', 'msgpack') else 'json'
+
+
+def encode_rows(cursor, rows: List[Dict[str, Any]], wire_format: str) -> Any:
+    '''
+    Encode fetched rows: list of dicts for json, column names once plus row arrays otherwise
+    '''
+    if wire_format == 'json':
+        return [dict(r) for r in rows]
+    
+    return {
+        'columns': list(rows[0].keys()) if rows else [column.name for column in cursor.description],
+        'rows': [list(r.values()) for r in rows]
+    }
+
+
+def list_response(payload: Dict[str, Any], wire_format: str) -> Dict[str, Any]:
+    '''
+    Build 200 response for a list payload in the negotiated wire format
+    '''
+    headers = {'Access-Control-Allow-Origin': '*', 'Vary': 'Accept'}
+    
+    if wire_format == 'msgpack':
+        headers['Content-Type'] = MSGPACK_MEDIA_TYPE
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': base64.b64encode(msgpack.packb(payload, default=str)).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    
+    headers['Content-Type'] = COLUMNAR_MEDIA_TYPE if wire_format == 'columnar' else 'application/json'
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json.dumps(payload, default=str),
+        'isBase64Encoded': False
+    }
+
+
+COLLECTION_FIELDS = {
+    'id': 'id',
+    'user_id': 'user_id',
+    'movie_id': 'movie_id',
+    'movie_title': 'movie_title',
+    'movie_genre': 'movie_genre',
+    'movie_rating': 'movie_rating',
+    'movie_image': 'movie_image',
+    'movie_description': 'movie_description',
+    'added_at': 'added_at'
+}
+
+
+def serve_membership(db_url: str, headers: Dict[str, Any], query_params: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    '''
+    Business: Which of ?movie_ids=1,2,3 the user has collected, for marking movie grids
+    Answered from the membership cache when enabled (connects only on a miss), otherwise by one = ANY(%s)
+    probe of the UNIQUE(user_id, movie_id) index; callers with a fresh consistency token skip the cache
+    Returns: {'collected': ids in request order}
+    '''
+    try:
+        movie_ids = list(dict.fromkeys(int(m) for m in (query_params.get('movie_ids') or '').split(',') if m.strip()))
+    except ValueError:
+        movie_ids = []
+    
+    if not movie_ids or len(movie_ids) > MEMBERSHIP_MAX_IDS:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': f'movie_ids: от 1 до {MEMBERSHIP_MAX_IDS} идентификаторов через запятую'}),
+            'isBase64Encoded': False
+        }
+    
+    db: Dict[str, Any] = {}
+    
+    def get_cursor():
+        if 'cursor' not in db:
+            db['conn'] = connect(db_url, headers, read_only=True)
+            db['cursor'] = db['conn'].cursor(cursor_factory=RealDictCursor)
+        return db['cursor']
+    
+    try:
+        recent_write = parse_consistency_token(headers.get(CONSISTENCY_HEADER) or headers.get(CONSISTENCY_HEADER.lower()))
+        members = None if recent_write else membership_cache.members(get_cursor, user_id)
+        if members is not None:
+            collected = membership_cache.intersect(members, movie_ids)
+        else:
+            cursor = get_cursor()
+            execute_prepared(
+                cursor,
+                "SELECT movie_id FROM user_collections WHERE user_id = %s AND movie_id = ANY(%s)",
+                (user_id, movie_ids)
+            )
+            found = {row['movie_id'] for row in cursor.fetchall()}
+            collected = [movie_id for movie_id in movie_ids if movie_id in found]
+    finally:
+        if 'cursor' in db:
+            db['cursor'].close()
+            db['conn'].close()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({'collected': collected}),
+        'isBase64Encoded': False
+    }
+
+
+def serve_import(db_url: str, headers: Dict[str, Any], event: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    '''
+    Business: Bulk import of a CSV watch-list sent as the raw request body (text/csv)
+    One transaction: COPY into a temp table, one INSERT … ON CONFLICT DO NOTHING merge and the counter update
+    Returns: {'received', 'imported', 'duplicates', 'skipped', 'errors'}
+    '''
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8', errors='replace')
+    
+    conn = connect(db_url, headers)
+    cursor = conn.cursor()
+    try:
+        try:
+            result = import_collection(conn, user_id, body)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        bump_stats(cursor, user_id, collection_count=result['imported'])
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    membership_cache.invalidate(user_id)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({'message': f"Импортировано фильмов: {result['imported']}", **result}),
+        'isBase64Encoded': False
+    }
+
+
+REVIEW_FIELDS = {
+    'id': 'r.id',
+    'user_id': 'r.user_id',
+    'movie_id': 'r.movie_id',
+    'movie_title': 'r.movie_title',
+    'movie_image': 'r.movie_image',
+    'rating': 'r.rating',
+    'review_text': 'r.review_text',
+    'status': 'r.status',
+    'moderation_comment': 'r.moderation_comment',
+    'created_at': 'r.created_at',
+    'updated_at': 'r.updated_at'
+}
+
+REVIEW_PROFILE_FIELDS = {'username': 'username', 'avatar_url': 'avatar_url'}
+
+
+def split_profile_fields(fields_param: Optional[str], profile_fields: Dict[str, str]) -> Tuple[Optional[str], List[str], bool]:
+    '''
+    Separate fields served from the profile cache from the SQL-projected ones
+    Returns: (fields for build_projection, requested profile fields, whether user_id was added only for the lookup)
+    '''
+    if not fields_param:
+        return None, list(profile_fields), False
+    
+    names = [f.strip() for f in fields_param.split(',') if f.strip()]
+    if not names:
+        return fields_param, [], False
+    
+    profile_names = [name for name in names if name in profile_fields]
+    sql_names = [name for name in names if name not in profile_fields]
+    strip_user_id = bool(profile_names) and 'user_id' not in sql_names
+    if strip_user_id:
+        sql_names.append('user_id')
+    return ','.join(sql_names), profile_names, strip_user_id
+
+
+def attach_profiles(rows: List[Dict[str, Any]], profiles: Dict[int, Dict[str, Any]], profile_fields: Dict[str, str],
+                    names: List[str], strip_user_id: bool) -> None:
+    '''
+    Fill author fields on rows from cached profiles instead of a JOIN on users
+    '''
+    for row in rows:
+        profile = profiles.get(row['user_id']) or {}
+        for name in names:
+            row[name] = profile.get(profile_fields[name])
+        if strip_user_id:
+            del row['user_id']
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage user movie collections and reviews
     Args: event - dict with httpMethod, body, headers, queryStringParameters
@@ -21,7 +266,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -29,7 +274,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     headers = event.get('headers', {})
-    auth_token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
+    auth_token = read_auth_token(headers)
     
     if not auth_token:
         return {
@@ -51,7 +296,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
+        payload = verify_token(auth_token, jwt_secret)
         user_id = payload['user_id']
     except jwt.ExpiredSignatureError:
         return {
@@ -68,7 +313,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(db_url)
+    if method == 'POST' and path == 'reviews':
+        limited = rate_limiter.check('review_create', user_id)
+        if limited:
+            return limited
+    
+    if method == 'POST' and path == 'import':
+        limited = rate_limiter.check('collection_import', user_id)
+        if limited:
+            return limited
+        return serve_import(db_url, headers, event, user_id)
+    
+    if method == 'GET' and path == 'membership':
+        return serve_membership(db_url, headers, event.get('queryStringParameters') or {}, user_id)
+    
+    conn = connect(db_url, headers, read_only=(method == 'GET'))
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -78,41 +337,52 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 movie_id = query_params.get('movie_id')
                 review_user_id = query_params.get('user_id')
                 
+                sql_fields, profile_names, strip_user_id = split_profile_fields(query_params.get('fields'), REVIEW_PROFILE_FIELDS)
+                projection = build_projection(sql_fields, REVIEW_FIELDS, 'r.*')
+                if projection is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Недопустимый параметр fields'}),
+                        'isBase64Encoded': False
+                    }
+                
                 if movie_id:
-                    cursor.execute(
-                        """SELECT r.*, u.username, u.avatar_url 
+                    execute_prepared(
+                        cursor,
+                        f"""SELECT {projection}
                            FROM reviews r 
-                           JOIN users u ON r.user_id = u.id 
                            WHERE r.movie_id = %s AND r.status = 'approved'
                            ORDER BY r.created_at DESC""",
                         (movie_id,)
                     )
                 elif review_user_id:
-                    cursor.execute(
-                        """SELECT r.*, u.username, u.avatar_url 
+                    execute_prepared(
+                        cursor,
+                        f"""SELECT {projection}
                            FROM reviews r 
-                           JOIN users u ON r.user_id = u.id 
                            WHERE r.user_id = %s 
                            ORDER BY r.created_at DESC""",
                         (review_user_id,)
                     )
                 else:
-                    cursor.execute(
-                        """SELECT r.*, u.username, u.avatar_url 
+                    execute_prepared(
+                        cursor,
+                        f"""SELECT {projection}
                            FROM reviews r 
-                           JOIN users u ON r.user_id = u.id 
                            WHERE r.user_id = %s 
                            ORDER BY r.created_at DESC""",
                         (user_id,)
                     )
                 
                 reviews = cursor.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                    'body': json.dumps([dict(r) for r in reviews], default=str),
-                    'isBase64Encoded': False
-                }
+                if profile_names and reviews:
+                    profiles = profile_cache.get_many(lambda: cursor, [r['user_id'] for r in reviews])
+                    attach_profiles(reviews, profiles, REVIEW_PROFILE_FIELDS, profile_names, strip_user_id)
+                
+                wire_format = negotiate_format(headers, query_params)
+                
+                return list_response(encode_rows(cursor, reviews, wire_format), wire_format)
             
             elif method == 'POST':
                 body_data = json.loads(event.get('body', '{}'))
@@ -160,6 +430,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     (user_id, movie_id, movie_title, movie_image, rating, review_text)
                 )
                 new_review = cursor.fetchone()
+                bump_stats(cursor, user_id, reviews_count=1)
                 conn.commit()
                 
                 return {
@@ -225,7 +496,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 
                 cursor.execute(
-                    "SELECT id, is_approved FROM reviews WHERE id = %s AND user_id = %s",
+                    "SELECT id, status FROM reviews WHERE id = %s AND user_id = %s",
                     (review_id, user_id)
                 )
                 review = cursor.fetchone()
@@ -237,7 +508,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                if review['is_approved']:
+                if review['status'] == 'approved':
                     return {
                         'statusCode': 403,
                         'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -249,6 +520,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     "DELETE FROM reviews WHERE id = %s AND user_id = %s",
                     (review_id, user_id)
                 )
+                bump_stats(cursor, user_id, reviews_count=-cursor.rowcount)
                 conn.commit()
                 
                 return {
@@ -259,18 +531,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         if method == 'GET':
-            cursor.execute(
-                "SELECT * FROM user_collections WHERE user_id = %s ORDER BY added_at DESC",
-                (user_id,)
-            )
-            collections = cursor.fetchall()
+            query_params = event.get('queryStringParameters', {}) or {}
+            projection = build_projection(query_params.get('fields'), COLLECTION_FIELDS, '*')
+            if projection is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Недопустимый параметр fields'}),
+                    'isBase64Encoded': False
+                }
             
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'collections': [dict(c) for c in collections]}, default=str),
-                'isBase64Encoded': False
-            }
+            page_query = collection_page_query(user_id, query_params, projection)
+            if page_query is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Недопустимые параметры выборки'}),
+                    'isBase64Encoded': False
+                }
+            sql, params, limit, sort = page_query
+            
+            # a generic plan can't use the index for LIKE with a parameter prefix, so title search is planned per call
+            if query_params.get('q'):
+                cursor.execute(sql, params)
+            else:
+                execute_prepared(cursor, sql, params)
+            collections, next_cursor = collection_page(cursor.fetchall(), limit, sort)
+            wire_format = negotiate_format(headers, query_params)
+            
+            return list_response({
+                'collections': encode_rows(cursor, collections, wire_format),
+                'next_cursor': next_cursor
+            }, wire_format)
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
@@ -311,7 +603,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 (user_id, movie_id, movie_title, movie_genre, movie_rating, movie_image, movie_description)
             )
             new_collection = cursor.fetchone()
+            bump_stats(cursor, user_id, collection_count=1)
             conn.commit()
+            membership_cache.invalidate(user_id)
             
             return {
                 'statusCode': 200,
@@ -350,7 +644,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 "DELETE FROM user_collections WHERE user_id = %s AND movie_id = %s",
                 (user_id, int(movie_id))
             )
+            bump_stats(cursor, user_id, collection_count=-cursor.rowcount)
             conn.commit()
+            membership_cache.invalidate(user_id)
             
             return {
                 'statusCode': 200,
@@ -369,4 +665,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+COLLECTION_PAGE_SIZE = int(os.environ.get('COLLECTION_PAGE_SIZE', '60'))
+COLLECTION_PAGE_MAX = 200
+
+# ?sort= -> (keyset expression, direction, cursor key parser), each backed by an index from V0022
+COLLECTION_SORTS = {
+    'added': ('added_at', 'DESC', datetime.fromisoformat),
+    'rating': ('COALESCE(movie_rating, -1)', 'DESC', float),
+    'title': ('lower(movie_title) COLLATE "C"', 'ASC', str)
+}
+
+
+def encode_cursor(sort: str, sort_key: Any, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort, sort_key, row_id], default=str).encode('utf-8')).decode('ascii')
+
+
+def collection_page_query(user_id: int, query_params: Dict[str, Any], projection: str) -> Optional[Tuple[str, List[Any], int, str]]:
+    '''
+    Keyset-paginated collection query from ?sort, ?cursor, ?limit and the ?genre, ?min_rating, ?max_rating, ?q filters
+    Returns: (sql, params, page size, sort) or None when a parameter is invalid; sql fetches one extra row to detect the next page
+    '''
+    sort = query_params.get('sort') or 'added'
+    if sort not in COLLECTION_SORTS:
+        return None
+    key, direction, parse_key = COLLECTION_SORTS[sort]
+    conditions = ['user_id = %s']
+    params: List[Any] = [user_id]
+
+    try:
+        limit = min(max(int(query_params.get('limit') or COLLECTION_PAGE_SIZE), 1), COLLECTION_PAGE_MAX)
+        if query_params.get('genre'):
+            conditions.append('movie_genre = %s')
+            params.append(query_params['genre'])
+        if query_params.get('min_rating'):
+            conditions.append('movie_rating >= %s')
+            params.append(float(query_params['min_rating']))
+        if query_params.get('max_rating'):
+            conditions.append('movie_rating <= %s')
+            params.append(float(query_params['max_rating']))
+        if query_params.get('q'):
+            prefix = query_params['q'].lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append('lower(movie_title) COLLATE "C" LIKE %s')
+            params.append(prefix + '%')
+        if query_params.get('cursor'):
+            cursor_sort, after_key, after_id = json.loads(base64.urlsafe_b64decode(query_params['cursor'].encode('ascii')))
+            # a cursor only continues the sort it was issued for, and its key must parse as that sort's column type
+            if cursor_sort != sort or not isinstance(after_key, (str, int, float)) or isinstance(after_key, bool):
+                return None
+            conditions.append(f"({key}, id) {'<' if direction == 'DESC' else '>'} (%s, %s)")
+            params.extend([parse_key(after_key), int(after_id)])
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+    sql = f"""SELECT {projection}, {key} AS sort_key, id AS sort_id
+              FROM user_collections
+              WHERE {' AND '.join(conditions)}
+              ORDER BY {key} {direction}, id {direction}
+              LIMIT %s"""
+    params.append(limit + 1)
+    return sql, params, limit, sort
+
+
+def collection_page(rows: List[Dict[str, Any]], limit: int, sort: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    '''
+    Trim the look-ahead row of a collection_page_query result and drop the sort columns
+    Returns: (rows of this page, next_cursor or None on the last page)
+    '''
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1]['sort_key'], rows[-1]['sort_id'])
+    for row in rows:
+        del row['sort_key'], row['sort_id']
+    return rows, next_cursor
@@ -0,0 +1,221 @@
+'''
+Local dev server that mounts every backend/<function>/index.py handler()
+Args: --host, --port, --workers (request worker pool size), --no-reload
+Usage: DATABASE_URL=postgresql://localhost/movies JWT_SECRET=dev python backend/dev_server.py
+       then call http://localhost:8000/<function>/?query, e.g. /playlists/?format=columnar
+'''
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def discover_functions() -> Dict[str, str]:
+    '''
+    Map function name to its directory: func2url.json entries plus any backend/*/index.py
+    '''
+    names = set()
+    func2url = os.path.join(BACKEND_DIR, 'func2url.json')
+    if os.path.exists(func2url):
+        with open(func2url) as f:
+            names.update(json.load(f).keys())
+
+    for entry in os.listdir(BACKEND_DIR):
+        if os.path.exists(os.path.join(BACKEND_DIR, entry, 'index.py')):
+            names.add(entry)
+
+    return {name: os.path.join(BACKEND_DIR, name) for name in sorted(names)
+            if os.path.exists(os.path.join(BACKEND_DIR, name, 'index.py'))}
+
+
+def source_mtime(function_dir: str) -> float:
+    return max(
+        os.path.getmtime(os.path.join(function_dir, name))
+        for name in os.listdir(function_dir) if name.endswith('.py')
+    )
+
+
+class FunctionRegistry:
+    '''
+    Loads handler() per function and reloads it when any .py file in its directory changes
+    '''
+
+    def __init__(self, functions: Dict[str, str], reload: bool):
+        self.functions = functions
+        self.reload = reload
+        self.loaded: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+
+    def load(self, name: str):
+        function_dir = self.functions[name]
+        # sibling modules (e.g. cache.py) share names across functions, drop them so each function imports its own
+        for module_name, module in list(sys.modules.items()):
+            module_file = getattr(module, '__file__', None) or ''
+            if module_file.startswith(BACKEND_DIR + os.sep) and os.path.dirname(module_file) != BACKEND_DIR:
+                del sys.modules[module_name]
+        spec = importlib.util.spec_from_file_location(f'backend_{name}', os.path.join(function_dir, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.path.insert(0, function_dir)
+        try:
+            spec.loader.exec_module(module)
+        finally:
+            sys.path.remove(function_dir)
+        return SimpleNamespace(handler=module.handler, mtime=source_mtime(function_dir))
+
+    def get(self, name: str):
+        if name not in self.functions:
+            return None
+
+        with self.lock:
+            entry = self.loaded.get(name)
+            if entry is None or (self.reload and source_mtime(self.functions[name]) > entry.mtime):
+                if entry is not None:
+                    print(f'[reload] {name}', flush=True)
+                entry = self.load(name)
+                self.loaded[name] = entry
+            return entry.handler
+
+
+class PooledHTTPServer(HTTPServer):
+    '''
+    HTTPServer that serves each connection on a bounded thread pool
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, handler_class, workers: int):
+        super().__init__(address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fn')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+def build_event(method: str, path: str, headers: Dict[str, str], body: bytes, source_ip: str = '127.0.0.1') -> Dict[str, Any]:
+    '''
+    Translate an HTTP request into the event shape cloud functions receive
+    '''
+    parts = urlsplit(path)
+    try:
+        text_body = body.decode('utf-8')
+        is_base64 = False
+    except UnicodeDecodeError:
+        text_body = base64.b64encode(body).decode('ascii')
+        is_base64 = True
+
+    return {
+        'httpMethod': method,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(parts.query, keep_blank_values=True)),
+        'body': text_body,
+        'isBase64Encoded': is_base64,
+        'path': parts.path,
+        'requestContext': {'requestId': str(uuid.uuid4()), 'identity': {'sourceIp': source_ip}}
+    }
+
+
+def make_request_handler(registry: FunctionRegistry):
+
+    class FunctionRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def dispatch(self):
+            segments = urlsplit(self.path).path.strip('/').split('/')
+            try:
+                handler = registry.get(segments[0]) if segments and segments[0] else None
+            except Exception as e:
+                traceback.print_exc()
+                self.send_json(500, {'error': f'Failed to load {segments[0]}: {type(e).__name__}: {e}'})
+                return
+
+            if handler is None:
+                self.send_json(404, {'error': 'Unknown function', 'functions': list(registry.functions)})
+                return
+
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            event = build_event(self.command, self.path, dict(self.headers.items()), body, self.client_address[0])
+            context = SimpleNamespace(request_id=event['requestContext']['requestId'], function_name=segments[0])
+
+            started = time.perf_counter()
+            try:
+                response = handler(event, context)
+            except Exception as e:
+                traceback.print_exc()
+                self.send_json(500, {'error': f'{type(e).__name__}: {e}'})
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            payload = response.get('body') or ''
+            data = base64.b64decode(payload) if response.get('isBase64Encoded') else payload.encode('utf-8')
+
+            self.send_response(response.get('statusCode', 200))
+            for key, value in (response.get('headers') or {}).items():
+                self.send_header(key, str(value))
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Server-Timing', f'handler;dur={elapsed_ms:.2f}')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_json(self, status: int, payload: Dict[str, Any]):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = dispatch
+
+    return FunctionRequestHandler
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='Serve backend functions locally')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('DEV_SERVER_WORKERS', '8')))
+    parser.add_argument('--no-reload', action='store_true', help='disable hot reload on source changes')
+    args = parser.parse_args(argv)
+
+    registry = FunctionRegistry(discover_functions(), reload=not args.no_reload)
+    server = PooledHTTPServer((args.host, args.port), make_request_handler(registry), workers=args.workers)
+
+    for name in registry.functions:
+        print(f'  http://{args.host}:{args.port}/{name}/', flush=True)
+    print(f'Serving {len(registry.functions)} functions with {args.workers} workers', flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import json
+import os
+import resource
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+
+from db import set_budget
+
+EXPORT_ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', '2000'))
+EXPORT_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', '65536'))
+# per FETCH of the server-side cursor, not for the whole export
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.environ.get('EXPORT_STATEMENT_TIMEOUT_MS', '30000'))
+
+# (section, sql) in output order; %(user_id)s is the exported user
+USER_SECTIONS: List[Tuple[str, str]] = [
+    ('profile', """SELECT id, email, username, role, avatar_url, age, bio, status, created_at
+                   FROM users WHERE id = %(user_id)s"""),
+    ('collections', "SELECT * FROM user_collections WHERE user_id = %(user_id)s ORDER BY id"),
+    ('reviews', "SELECT * FROM reviews WHERE user_id = %(user_id)s ORDER BY id"),
+    ('playlists', "SELECT * FROM playlists WHERE user_id = %(user_id)s ORDER BY id"),
+    ('playlist_movies', """SELECT pm.* FROM playlist_movies pm
+                           JOIN playlists p ON p.id = pm.playlist_id
+                           WHERE p.user_id = %(user_id)s
+                           ORDER BY pm.playlist_id, pm.position, pm.id"""),
+    ('saved_playlists', "SELECT * FROM saved_playlists WHERE user_id = %(user_id)s ORDER BY id"),
+    ('notifications', "SELECT * FROM notifications WHERE user_id = %(user_id)s ORDER BY created_at, id")
+]
+
+APPROVED_SECTIONS: List[Tuple[str, str]] = [
+    ('playlists', """SELECT p.*, u.username AS author_name
+                     FROM playlists p LEFT JOIN users u ON u.id = p.user_id
+                     WHERE p.status = 'approved' AND p.is_public = true
+                     ORDER BY p.id"""),
+    ('playlist_movies', """SELECT pm.* FROM playlist_movies pm
+                           JOIN playlists p ON p.id = pm.playlist_id
+                           WHERE p.status = 'approved' AND p.is_public = true
+                           ORDER BY pm.playlist_id, pm.position, pm.id"""),
+    ('reviews', """SELECT r.*, u.username
+                   FROM reviews r LEFT JOIN users u ON u.id = r.user_id
+                   WHERE r.status = 'approved'
+                   ORDER BY r.id""")
+]
+
+EXPORT_SCOPES = {'user': USER_SECTIONS, 'approved': APPROVED_SECTIONS}
+
+
+def peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ChunkedWriter:
+    '''
+    Joins NDJSON lines into chunks of about EXPORT_CHUNK_BYTES before handing them to write()
+    '''
+
+    def __init__(self, write: Callable[[bytes], Any], chunk_bytes: int):
+        self.write = write
+        self.chunk_bytes = chunk_bytes
+        self.lines: List[bytes] = []
+        self.size = 0
+        self.total = 0
+
+    def line(self, record: Dict[str, Any]) -> None:
+        data = json.dumps(record, default=str, ensure_ascii=False).encode('utf-8') + b'\n'
+        self.lines.append(data)
+        self.size += len(data)
+        if self.size >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.lines:
+            self.write(b''.join(self.lines))
+            self.total += self.size
+            self.lines = []
+            self.size = 0
+
+
+def stream_section(conn, writer: ChunkedWriter, section: str, sql: str, params: Dict[str, Any], itersize: int) -> int:
+    '''
+    Stream one section through a named (server-side) cursor, at most itersize rows are held at a time
+    Returns: rows written
+    '''
+    cursor = conn.cursor(name=f'export_{section}')
+    cursor.itersize = itersize
+    try:
+        cursor.execute(sql, params)
+        columns: Optional[Sequence[str]] = None
+        rows = 0
+        for row in cursor:
+            if columns is None:
+                columns = [column.name for column in cursor.description]
+            writer.line({'type': section, 'data': dict(zip(columns, row))})
+            rows += 1
+        return rows
+    finally:
+        cursor.close()
+
+
+def stream_export(conn, write: Callable[[bytes], Any], scope: str = 'user', user_id: Optional[int] = None,
+                  itersize: int = EXPORT_ITERSIZE, chunk_bytes: int = EXPORT_CHUNK_BYTES) -> Dict[str, Any]:
+    '''
+    Business: Write an NDJSON export to write() in chunks with memory independent of the data size
+    Args: scope - 'user' (everything of user_id) or 'approved' (all public approved content);
+          write - sink for byte chunks (file.write, gzip stream, socket)
+    Every section is read in one REPEATABLE READ snapshot, so the export is consistent across tables.
+    Output: a header line {'type': 'export', ...}, then {'type': <section>, 'data': row} per row.
+    Returns: {'scope', 'rows': {section: count}, 'bytes'}
+    '''
+    sections = EXPORT_SCOPES[scope]
+    writer = ChunkedWriter(write, chunk_bytes)
+    counts: Dict[str, int] = {}
+    conn.rollback()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        set_budget(cursor, EXPORT_STATEMENT_TIMEOUT_MS)
+        writer.line({'type': 'export', 'data': {
+            'scope': scope,
+            'user_id': user_id,
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'sections': [section for section, _ in sections]
+        }})
+        for section, sql in sections:
+            counts[section] = stream_section(conn, writer, section, sql, {'user_id': user_id}, itersize)
+        writer.flush()
+    finally:
+        cursor.close()
+        conn.rollback()
+
+    return {'scope': scope, 'rows': counts, 'bytes': writer.total}
+
+
+if __name__ == '__main__':
+    # python backend/export/exporter.py user <user_id> [out.ndjson] | approved [out.ndjson]; '-' or no file for stdout
+    import sys
+    import time
+    from db import connect_maintenance
+
+    args = sys.argv[1:]
+    scope = args.pop(0) if args else 'user'
+    export_user_id = int(args.pop(0)) if scope == 'user' else None
+    target = args.pop(0) if args else '-'
+
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    out = sys.stdout.buffer if target == '-' else open(target, 'wb')
+    try:
+        started = time.perf_counter()
+        result = stream_export(conn, out.write, scope, export_user_id)
+        out.flush()
+        sys.stderr.write(json.dumps({
+            **result,
+            'seconds': round(time.perf_counter() - started, 2),
+            'peak_rss_kb': peak_rss_kb()
+        }) + '\n')
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        conn.close()
@@ -0,0 +1,165 @@
+import json
+import os
+import base64
+import gzip
+import io
+import jwt
+from typing import Dict, Any
+from db import connect, run_request, execute_prepared
+from tokens import read_auth_token, verify_token
+from responses import GZIP_LEVEL, accepted_encodings
+from ratelimit import RateLimiter, make_shared_buckets
+from exporter import stream_export
+
+# exports read whole tables of a user, (capacity, period seconds) per user
+rate_limiter = RateLimiter({'export': (3, 3600)}, make_shared_buckets())
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: NDJSON data export, the caller's own data or (admins) all approved public content
+    Args: event - dict with httpMethod, headers, queryStringParameters (?scope=user|approved)
+          context - object with request_id, function_name
+    Returns: application/x-ndjson attachment, gzip-encoded while it is produced when the client accepts gzip
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    db_url = os.environ.get('DATABASE_URL')
+    jwt_secret = os.environ.get('JWT_SECRET')
+    
+    if not db_url or not jwt_secret:
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Server configuration error'}),
+            'isBase64Encoded': False
+        }
+    
+    headers = event.get('headers', {})
+    auth_token = read_auth_token(headers)
+    
+    if not auth_token:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Требуется авторизация'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        payload = verify_token(auth_token, jwt_secret)
+        user_id = payload['user_id']
+    except jwt.ExpiredSignatureError:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Токен истёк'}),
+            'isBase64Encoded': False
+        }
+    except jwt.InvalidTokenError:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Неверный токен'}),
+            'isBase64Encoded': False
+        }
+    
+    query_params = event.get('queryStringParameters') or {}
+    scope = query_params.get('scope') or 'user'
+    
+    if scope not in ('user', 'approved'):
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'scope должен быть user или approved'}),
+            'isBase64Encoded': False
+        }
+    
+    limited = rate_limiter.check('export', user_id)
+    if limited:
+        return limited
+    
+    conn = connect(db_url, headers, read_only=True)
+    
+    try:
+        if scope == 'approved':
+            cursor = conn.cursor()
+            try:
+                execute_prepared(cursor, "SELECT role FROM users WHERE id = %s", (user_id,))
+                user = cursor.fetchone()
+            finally:
+                cursor.close()
+            
+            if not user or user[0] != 'admin':
+                return {
+                    'statusCode': 403,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
+                    'isBase64Encoded': False
+                }
+        
+        # the function has to return one body; compressing chunk by chunk keeps only the gzip output in memory
+        buffer = io.BytesIO()
+        use_gzip = 'gzip' in accepted_encodings(headers)
+        sink = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) if use_gzip else buffer
+        result = stream_export(conn, sink.write, scope, user_id if scope == 'user' else None)
+        if use_gzip:
+            sink.close()
+    finally:
+        conn.close()
+    
+    response_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Export-Rows',
+        'Content-Type': 'application/x-ndjson; charset=utf-8',
+        'Content-Disposition': f'attachment; filename="export-{scope}.ndjson"',
+        'X-Export-Rows': str(sum(result['rows'].values())),
+        'Vary': 'Accept-Encoding'
+    }
+    
+    if use_gzip:
+        response_headers['Content-Encoding'] = 'gzip'
+        return {
+            'statusCode': 200,
+            'headers': response_headers,
+            'body': base64.b64encode(buffer.getvalue()).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': response_headers,
+        'body': buffer.getvalue().decode('utf-8'),
+        'isBase64Encoded': False
+    }
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point; the export body is already encoded per Accept-Encoding by handle_request
+    Args: event - dict with httpMethod, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request
+    '''
+    return run_request(handle_request, event, context)
@@ -0,0 +1,340 @@
+import json
+import os
+import time
+import jwt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from cache import ProfileCache, make_shared_cache
+from db import DatabaseUnavailable, begin_request, breaker, connect, load_metrics, request_state, run_request
+from tokens import read_auth_token, verify_token
+from responses import compress_response
+from paging import collection_page, collection_page_query
+from retention import window_start
+
+GATEWAY_MAX_ITEMS = int(os.environ.get('GATEWAY_MAX_ITEMS', '10'))
+GATEWAY_CONNECTIONS = int(os.environ.get('GATEWAY_CONNECTIONS', '1'))
+
+profile_cache = ProfileCache(
+    int(os.environ.get('PROFILE_CACHE_SIZE', '1000')),
+    float(os.environ.get('PROFILE_CACHE_TTL', '30')),
+    float(os.environ.get('PROFILE_SHARED_CACHE_TTL', '3600')),
+    make_shared_cache()
+)
+
+# per-request DB state that run_request reads on the request thread
+REQUEST_STATE_FIELDS = ('db_used', 'probe', 'route', 'commit_lsn')
+
+
+def load_profile(cursor, user_id: Optional[int], params: Dict[str, Any]) -> Tuple[int, Any]:
+    target_user_id = params.get('user_id') or user_id
+    cursor.execute(
+        "SELECT id, username, email, role, avatar_url, age, bio, status, created_at FROM users WHERE id = %s",
+        (target_user_id,)
+    )
+    user = cursor.fetchone()
+    if not user:
+        return 404, {'error': 'User not found'}
+    return 200, dict(user)
+
+
+def load_collections(cursor, user_id: Optional[int], params: Dict[str, Any]) -> Tuple[int, Any]:
+    # same keyset pages as GET /collections: params take sort, cursor, limit and the filters
+    page_query = collection_page_query(user_id, params, '*')
+    if page_query is None:
+        return 400, {'error': 'Недопустимые параметры выборки'}
+    sql, query_params, limit, sort = page_query
+    cursor.execute(sql, query_params)
+    collections, next_cursor = collection_page([dict(c) for c in cursor.fetchall()], limit, sort)
+    return 200, {'collections': collections, 'next_cursor': next_cursor}
+
+
+def load_reviews(cursor, user_id: Optional[int], params: Dict[str, Any]) -> Tuple[int, Any]:
+    cursor.execute(
+        """SELECT r.* 
+           FROM reviews r 
+           WHERE r.user_id = %s 
+           ORDER BY r.created_at DESC""",
+        (params.get('user_id') or user_id,)
+    )
+    reviews = [dict(r) for r in cursor.fetchall()]
+    # author fields come from the profile cache instead of a JOIN on users, as in the collections function
+    profiles = profile_cache.get_many(lambda: cursor, [r['user_id'] for r in reviews]) if reviews else {}
+    for review in reviews:
+        profile = profiles.get(review['user_id']) or {}
+        review['username'] = profile.get('username')
+        review['avatar_url'] = profile.get('avatar_url')
+    return 200, reviews
+
+
+def load_playlists(cursor, user_id: Optional[int], params: Dict[str, Any]) -> Tuple[int, Any]:
+    cursor.execute(
+        """SELECT p.*, u.username as author_name,
+           (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
+           FROM playlists p
+           LEFT JOIN users u ON p.user_id = u.id
+           WHERE p.user_id = %s
+           ORDER BY p.created_at DESC""",
+        (params.get('user_id') or user_id,)
+    )
+    return 200, {'playlists': [dict(p) for p in cursor.fetchall()]}
+
+
+def load_saved_playlists(cursor, user_id: Optional[int], params: Dict[str, Any]) -> Tuple[int, Any]:
+    cursor.execute(
+        "SELECT playlist_id FROM saved_playlists WHERE user_id = %s",
+        (user_id,)
+    )
+    return 200, {'saved': [dict(s) for s in cursor.fetchall()]}
+
+
+def load_notifications(cursor, user_id: Optional[int], params: Dict[str, Any]) -> Tuple[int, Any]:
+    # same retention window as the notifications function, so the planner skips expired partitions
+    since = window_start()
+    cursor.execute(
+        """SELECT * FROM notifications 
+           WHERE user_id = %s AND created_at >= %s 
+           ORDER BY created_at DESC 
+           LIMIT 50""",
+        (user_id, since)
+    )
+    notifications = cursor.fetchall()
+    cursor.execute(
+        "SELECT COUNT(*) as count FROM notifications WHERE user_id = %s AND is_read = false AND created_at >= %s",
+        (user_id, since)
+    )
+    return 200, {
+        'notifications': [dict(n) for n in notifications],
+        'unread_count': cursor.fetchone()['count']
+    }
+
+
+OPERATIONS = {
+    'profile': load_profile,
+    'collections': load_collections,
+    'reviews': load_reviews,
+    'playlists': load_playlists,
+    'saved_playlists': load_saved_playlists,
+    'notifications': load_notifications
+}
+
+PUBLIC_OPERATIONS = {'playlists'}
+
+
+def run_batch(db_url: str, headers: Dict[str, Any], user_id: Optional[int], items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+    '''
+    Run sub-requests sequentially on one read-only connection
+    Returns: per-item results with status, body and elapsed_ms, plus connect time in ms
+    '''
+    results = []
+    connect_started = time.perf_counter()
+    conn = connect(db_url, headers, read_only=True)
+    connect_ms = (time.perf_counter() - connect_started) * 1000
+    conn.set_session(readonly=True)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    
+    try:
+        for item in items:
+            started = time.perf_counter()
+            try:
+                status, body = OPERATIONS[item['op']](cursor, user_id, item.get('params') or {})
+            except psycopg2.OperationalError:
+                # lost connection, statement or lock timeout: run_request answers 503 and counts it on the breaker
+                raise
+            except psycopg2.Error:
+                conn.rollback()
+                status, body = 500, {'error': 'Database error'}
+            results.append({
+                'id': item['id'],
+                'status': status,
+                'body': body,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+            })
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    return results, connect_ms
+
+
+def run_shard(probe: bool, db_url: str, headers: Dict[str, Any], user_id: Optional[int], items: List[Dict[str, Any]]) -> Tuple[Any, Dict[str, Any]]:
+    '''
+    Worker-thread side of run_shards: request_state is thread-local, so the shard returns its DB state with the outcome
+    Returns: (run_batch result or the exception it raised, request_state fields)
+    '''
+    begin_request()
+    request_state.probe = probe
+    try:
+        outcome = run_batch(db_url, headers, user_id, items)
+    except Exception as e:
+        outcome = e
+    return outcome, {field: getattr(request_state, field) for field in REQUEST_STATE_FIELDS}
+
+
+def run_shards(db_url: str, headers: Dict[str, Any], user_id: Optional[int], shards: List[List[Dict[str, Any]]]) -> List[Tuple[List[Dict[str, Any]], float]]:
+    '''
+    Run shards on parallel connections and merge their DB state into the request thread's request_state,
+    so run_request records the breaker outcome and X-DB-Route as it does for a single connection
+    The circuit is checked once here: a half-open probe covers every shard instead of only the first one
+    '''
+    if not breaker.allow():
+        load_metrics['rejected_open'] += 1
+        raise DatabaseUnavailable('circuit_open', breaker.retry_after())
+    probe = request_state.probe
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        outcomes = list(executor.map(lambda items: run_shard(probe, db_url, headers, user_id, items), shards))
+    
+    routes = set()
+    for _, state in outcomes:
+        request_state.db_used = request_state.db_used or state['db_used']
+        request_state.probe = request_state.probe or state['probe']
+        request_state.commit_lsn = request_state.commit_lsn or state['commit_lsn']
+        if state['route']:
+            routes.add(state['route'])
+    if routes:
+        request_state.route = 'primary' if 'primary' in routes else routes.pop()
+    
+    for outcome, _ in outcomes:
+        if isinstance(outcome, Exception):
+            raise outcome
+    return [outcome for outcome, _ in outcomes]
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Serve a whole page in one call by multiplexing read sub-requests
+    Args: event - dict with httpMethod, body, headers
+          context - object with request_id, function_name
+    Returns: HTTP response with per-item results and timing
+    '''
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    db_url = os.environ.get('DATABASE_URL')
+    jwt_secret = os.environ.get('JWT_SECRET')
+    
+    if not db_url or not jwt_secret:
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Server configuration error'}),
+            'isBase64Encoded': False
+        }
+    
+    started = time.perf_counter()
+    body_data = json.loads(event.get('body') or '{}')
+    requests = body_data.get('requests')
+    
+    if not isinstance(requests, list) or not requests or len(requests) > GATEWAY_MAX_ITEMS:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': f'requests должен содержать от 1 до {GATEWAY_MAX_ITEMS} элементов'}),
+            'isBase64Encoded': False
+        }
+    
+    headers = event.get('headers', {})
+    auth_token = read_auth_token(headers)
+    
+    user_id = None
+    if auth_token:
+        try:
+            payload = verify_token(auth_token, jwt_secret)
+            user_id = payload['user_id']
+        except jwt.ExpiredSignatureError:
+            return {
+                'statusCode': 401,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Токен истёк'}),
+                'isBase64Encoded': False
+            }
+        except jwt.InvalidTokenError:
+            return {
+                'statusCode': 401,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Неверный токен'}),
+                'isBase64Encoded': False
+            }
+    auth_ms = (time.perf_counter() - started) * 1000
+    
+    results: Dict[int, Dict[str, Any]] = {}
+    runnable = []
+    for index, item in enumerate(requests):
+        item_id = item.get('id', index) if isinstance(item, dict) else index
+        op = item.get('op') if isinstance(item, dict) else None
+        
+        if op not in OPERATIONS:
+            results[index] = {'id': item_id, 'status': 400, 'body': {'error': 'Unknown op'}}
+        elif item.get('params') is not None and not isinstance(item['params'], dict):
+            results[index] = {'id': item_id, 'status': 400, 'body': {'error': 'params должен быть объектом'}}
+        elif user_id is None and op not in PUBLIC_OPERATIONS:
+            results[index] = {'id': item_id, 'status': 401, 'body': {'error': 'Требуется авторизация'}}
+        elif op in PUBLIC_OPERATIONS and user_id is None and not (item.get('params') or {}).get('user_id'):
+            results[index] = {'id': item_id, 'status': 400, 'body': {'error': 'user_id обязателен'}}
+        else:
+            runnable.append((index, {'id': item_id, 'op': op, 'params': item.get('params')}))
+    
+    connect_times = []
+    if runnable:
+        workers = min(max(GATEWAY_CONNECTIONS, 1), len(runnable))
+        shards = [runnable[i::workers] for i in range(workers)]
+        if workers == 1:
+            shard_results = [run_batch(db_url, headers, user_id, [item for _, item in runnable])]
+        else:
+            shard_results = run_shards(db_url, headers, user_id, [[item for _, item in shard] for shard in shards])
+        for shard, (shard_result, connect_ms) in zip(shards, shard_results):
+            connect_times.append(connect_ms)
+            for (index, _), result in zip(shard, shard_result):
+                results[index] = result
+    total_ms = (time.perf_counter() - started) * 1000
+    
+    connect_ms = sum(connect_times) / len(connect_times) if connect_times else 0.0
+    avoided_calls = len(runnable) - len(connect_times)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'results': [results[i] for i in range(len(requests))],
+            'timing': {
+                'total_ms': round(total_ms, 2),
+                'auth_ms': round(auth_ms, 2),
+                'connect_ms': round(connect_ms, 2),
+                'estimated_saved_ms': round(avoided_calls * (connect_ms + auth_ms), 2)
+            }
+        }, default=str),
+        'isBase64Encoded': False
+    }
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
\ No newline at end of file
@@ -1,11 +1,167 @@
 import json
 import os
+import time
 import jwt
-from typing import Dict, Any
-import psycopg2
+from typing import Dict, Any, Optional, Tuple
 from psycopg2.extras import RealDictCursor
+from db import connect, run_request, execute_prepared, set_budget
+from aio import async_enabled, async_runner, read_dsn
+from tokens import read_auth_token, verify_token
+from responses import build_projection, compress_response
+from outbox import enqueue_notification
+from stats import bump_stats
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+PERM_EPOCH_TTL = float(os.environ.get('PERM_EPOCH_TTL', '30'))
+# (statement_timeout ms, lock_timeout ms) for approve/reject: give up quickly instead of queueing behind row locks
+DECISION_BUDGET = (2000, 300)
+
+perm_epochs: Dict[int, Tuple[float, int]] = {}
+
+
+def current_perm_epoch(cursor, user_id: int) -> Optional[int]:
+    '''
+    Permissions epoch of a user, cached in-process for PERM_EPOCH_TTL seconds
+    Returns: None when the user no longer exists
+    '''
+    cached = perm_epochs.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    execute_prepared(cursor, "SELECT perm_epoch FROM users WHERE id = %s", (user_id,))
+    row = cursor.fetchone()
+    if not row:
+        perm_epochs.pop(user_id, None)
+        return None
+    
+    perm_epochs[user_id] = (time.monotonic() + PERM_EPOCH_TTL, row['perm_epoch'])
+    return row['perm_epoch']
+
+
+REVIEW_FIELDS = {
+    'id': 'r.id',
+    'user_id': 'r.user_id',
+    'movie_id': 'r.movie_id',
+    'movie_title': 'r.movie_title',
+    'movie_image': 'r.movie_image',
+    'rating': 'r.rating',
+    'review_text': 'r.review_text',
+    'status': 'r.status',
+    'moderation_comment': 'r.moderation_comment',
+    'created_at': 'r.created_at',
+    'updated_at': 'r.updated_at',
+    'author_name': 'u.username',
+    'author_avatar': 'u.avatar_url'
+}
+
+PLAYLIST_FIELDS = {
+    'id': 'p.id',
+    'user_id': 'p.user_id',
+    'title': 'p.title',
+    'description': 'p.description',
+    'is_public': 'p.is_public',
+    'status': 'p.status',
+    'cover_image_url': 'p.cover_image_url',
+    'moderation_comment': 'p.moderation_comment',
+    'moderated_at': 'p.moderated_at',
+    'moderated_by': 'p.moderated_by',
+    'created_at': 'p.created_at',
+    'updated_at': 'p.updated_at',
+    'author_name': 'u.username',
+    'movies_count': '(SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id)'
+}
+
+
+def moderation_queue_sql(query_params: Dict[str, Any], placeholder: str) -> Optional[Tuple[str, str]]:
+    '''
+    Build the moderation queue query for ?type=playlists|reviews with the status bound to placeholder
+    Returns: (response key, sql), None when ?fields is invalid
+    '''
+    if query_params.get('type', 'playlists') == 'reviews':
+        projection = build_projection(
+            query_params.get('fields'), REVIEW_FIELDS,
+            'r.*, u.username as author_name, u.avatar_url as author_avatar'
+        )
+        if projection is None:
+            return None
+        return 'reviews', f"""SELECT {projection}
+               FROM reviews r
+               LEFT JOIN users u ON r.user_id = u.id
+               WHERE r.status = {placeholder}
+               ORDER BY r.created_at ASC"""
+    
+    projection = build_projection(
+        query_params.get('fields'), PLAYLIST_FIELDS,
+        """p.*, u.username as author_name,
+           (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count"""
+    )
+    if projection is None:
+        return None
+    return 'playlists', f"""SELECT {projection}
+               FROM playlists p
+               LEFT JOIN users u ON p.user_id = u.id
+               WHERE p.status = {placeholder}
+               ORDER BY p.created_at ASC"""
+
+
+def serve_queue_async(db_url: str, headers: Dict[str, Any], query_params: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Business: HANDLER_MODE=async variant of the moderation GET, the admin check runs concurrently with the queue query
+    Returns: same response as the synchronous path; the queue is discarded when the check fails
+    '''
+    queue = moderation_queue_sql(query_params, '$1')
+    if queue is None:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Недопустимый параметр fields'}),
+            'isBase64Encoded': False
+        }
+    
+    key, sql = queue
+    user_id = payload['user_id']
+    queries = [(sql, (query_params.get('status', 'pending'),))]
+    cached = perm_epochs.get(user_id)
+    epoch_cached = 'role' in payload and cached is not None and cached[0] > time.monotonic()
+    if 'role' in payload and not epoch_cached:
+        queries.append(("SELECT perm_epoch FROM users WHERE id = $1", (user_id,)))
+    elif 'role' not in payload:
+        queries.append(("SELECT role FROM users WHERE id = $1", (user_id,)))
+    
+    results = async_runner.run(read_dsn(db_url, headers), *queries)
+    rows = results[0]
+    
+    if 'role' in payload:
+        if epoch_cached:
+            epoch = cached[1]
+        elif results[1]:
+            epoch = results[1][0]['perm_epoch']
+            perm_epochs[user_id] = (time.monotonic() + PERM_EPOCH_TTL, epoch)
+        else:
+            epoch = None
+        if epoch != payload.get('perm_epoch'):
+            return {
+                'statusCode': 401,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'error': 'Права доступа изменились, войдите заново'}),
+                'isBase64Encoded': False
+            }
+    elif not results[1] or results[1][0]['role'] != 'admin':
+        return {
+            'statusCode': 403,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({key: rows}, default=str),
+        'isBase64Encoded': False
+    }
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Admin moderation of user playlists and reviews
     Args: event - dict with httpMethod, body, headers, queryStringParameters
@@ -20,7 +176,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -39,7 +195,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     headers = event.get('headers', {})
-    auth_token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
+    auth_token = read_auth_token(headers)
     
     if not auth_token:
         return {
@@ -50,7 +206,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
+        payload = verify_token(auth_token, jwt_secret)
         user_id = payload['user_id']
     except jwt.ExpiredSignatureError:
         return {
@@ -67,66 +223,69 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(db_url)
+    if 'role' in payload and payload['role'] != 'admin':
+        return {
+            'statusCode': 403,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
+            'isBase64Encoded': False
+        }
+    
+    if method == 'GET' and async_enabled():
+        return serve_queue_async(db_url, headers, event.get('queryStringParameters') or {}, payload)
+    
+    conn = connect(db_url, headers, read_only=(method == 'GET'))
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
-        cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'admin':
-            return {
-                'statusCode': 403,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
-                'isBase64Encoded': False
-            }
-        
-        if method == 'GET':
-            query_params = event.get('queryStringParameters', {}) or {}
-            content_type = query_params.get('type', 'playlists')
-            status_filter = query_params.get('status', 'pending')
+        if 'role' in payload:
+            if current_perm_epoch(cursor, user_id) != payload.get('perm_epoch'):
+                return {
+                    'statusCode': 401,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Права доступа изменились, войдите заново'}),
+                    'isBase64Encoded': False
+                }
+        else:
+            execute_prepared(cursor, "SELECT role FROM users WHERE id = %s", (user_id,))
+            user = cursor.fetchone()
             
-            if content_type == 'reviews':
-                cursor.execute(
-                    """SELECT r.*, u.username as author_name, u.avatar_url as author_avatar
-                       FROM reviews r
-                       LEFT JOIN users u ON r.user_id = u.id
-                       WHERE r.status = %s
-                       ORDER BY r.created_at ASC""",
-                    (status_filter,)
-                )
-                reviews = cursor.fetchall()
-                
+            if not user or user['role'] != 'admin':
                 return {
-                    'statusCode': 200,
+                    'statusCode': 403,
                     'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                    'body': json.dumps({'reviews': [dict(r) for r in reviews]}, default=str),
+                    'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
                     'isBase64Encoded': False
                 }
-            else:
-                cursor.execute(
-                    """SELECT p.*, u.username as author_name,
-                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
-                       FROM playlists p
-                       LEFT JOIN users u ON p.user_id = u.id
-                       WHERE p.status = %s
-                       ORDER BY p.created_at ASC""",
-                    (status_filter,)
-                )
-                playlists = cursor.fetchall()
-                
+        
+        if method == 'GET':
+            query_params = event.get('queryStringParameters', {}) or {}
+            queue = moderation_queue_sql(query_params, '%s')
+            
+            if queue is None:
                 return {
-                    'statusCode': 200,
+                    'statusCode': 400,
                     'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                    'body': json.dumps({'playlists': [dict(p) for p in playlists]}, default=str),
+                    'body': json.dumps({'error': 'Недопустимый параметр fields'}),
                     'isBase64Encoded': False
                 }
+            
+            key, sql = queue
+            execute_prepared(cursor, sql, (query_params.get('status', 'pending'),))
+            rows = cursor.fetchall()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({key: [dict(r) for r in rows]}, default=str),
+                'isBase64Encoded': False
+            }
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             action = body_data.get('action')
             content_type = body_data.get('type', 'playlist')
+            set_budget(cursor, *DECISION_BUDGET)
             
             if content_type == 'review':
                 review_id = body_data.get('review_id')
@@ -141,21 +300,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 if action == 'approve':
                     cursor.execute(
-                        """UPDATE reviews 
+                        """UPDATE reviews r
                            SET status = 'approved'
-                           WHERE id = %s RETURNING *""",
+                           FROM (SELECT id, status FROM reviews WHERE id = %s FOR UPDATE) old
+                           WHERE r.id = old.id RETURNING r.*, old.status AS previous_status""",
                         (review_id,)
                     )
                     review = cursor.fetchone()
+                    if not review:
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'error': 'Рецензия не найдена'}),
+                            'isBase64Encoded': False
+                        }
+                    if review.pop('previous_status') != 'approved':
+                        bump_stats(cursor, review['user_id'], approved_reviews_count=1)
                     
-                    cursor.execute(
-                        """INSERT INTO notifications (user_id, type, title, message)
-                           VALUES (%s, 'review_approved', %s, %s)""",
-                        (
-                            review['user_id'],
-                            'Рецензия одобрена',
-                            f"Ваша рецензия на \"{review['movie_title']}\" прошла модерацию и опубликована!"
-                        )
+                    enqueue_notification(
+                        cursor,
+                        review['user_id'],
+                        'review_approved',
+                        'Рецензия одобрена',
+                        f"Ваша рецензия на \"{review['movie_title']}\" прошла модерацию и опубликована!"
                     )
                     
                     conn.commit()
@@ -170,25 +337,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 elif action == 'reject':
                     comment = body_data.get('comment', '')
                     cursor.execute(
-                        """UPDATE reviews 
+                        """UPDATE reviews r
                            SET status = 'rejected', moderation_comment = %s
-                           WHERE id = %s RETURNING *""",
+                           FROM (SELECT id, status FROM reviews WHERE id = %s FOR UPDATE) old
+                           WHERE r.id = old.id RETURNING r.*, old.status AS previous_status""",
                         (comment, review_id)
                     )
                     review = cursor.fetchone()
+                    if not review:
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'error': 'Рецензия не найдена'}),
+                            'isBase64Encoded': False
+                        }
+                    if review.pop('previous_status') == 'approved':
+                        bump_stats(cursor, review['user_id'], approved_reviews_count=-1)
                     
                     notification_message = f"Ваша рецензия на \"{review['movie_title']}\" была отклонена модератором."
                     if comment:
                         notification_message += f" Причина: {comment}"
                     
-                    cursor.execute(
-                        """INSERT INTO notifications (user_id, type, title, message)
-                           VALUES (%s, 'review_rejected', %s, %s)""",
-                        (
-                            review['user_id'],
-                            'Рецензия отклонена',
-                            notification_message
-                        )
+                    enqueue_notification(
+                        cursor,
+                        review['user_id'],
+                        'review_rejected',
+                        'Рецензия отклонена',
+                        notification_message
                     )
                     
                     conn.commit()
@@ -220,15 +395,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     )
                     playlist = cursor.fetchone()
                     
+                    enqueue_notification(
+                        cursor,
+                        playlist['user_id'],
+                        'playlist_approved',
+                        'Подборка одобрена',
+                        f"Ваша подборка \"{playlist['title']}\" прошла модерацию и теперь доступна всем пользователям!",
+                        playlist_id
+                    )
+                    
                     cursor.execute(
-                        """INSERT INTO notifications (user_id, type, title, message, playlist_id)
-                           VALUES (%s, 'playlist_approved', %s, %s, %s)""",
-                        (
-                            playlist['user_id'],
-                            'Подборка одобрена',
-                            f"Ваша подборка \"{playlist['title']}\" прошла модерацию и теперь доступна всем пользователям!",
-                            playlist_id
-                        )
+                        "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'playlist_feed'"
                     )
                     
                     conn.commit()
@@ -255,15 +432,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     if comment:
                         notification_message += f" Причина: {comment}"
                     
+                    enqueue_notification(
+                        cursor,
+                        playlist['user_id'],
+                        'playlist_rejected',
+                        'Подборка отклонена',
+                        notification_message,
+                        playlist_id
+                    )
+                    
                     cursor.execute(
-                        """INSERT INTO notifications (user_id, type, title, message, playlist_id)
-                           VALUES (%s, 'playlist_rejected', %s, %s, %s)""",
-                        (
-                            playlist['user_id'],
-                            'Подборка отклонена',
-                            notification_message,
-                            playlist_id
-                        )
+                        "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'playlist_feed'"
                     )
                     
                     conn.commit()
@@ -284,4 +463,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from db import (
+    CONSISTENCY_HEADER, DB_LOCK_TIMEOUT_MS, DB_STATEMENT_TIMEOUT_MS,
+    DatabaseUnavailable, breaker, load_metrics, parse_consistency_token, request_state, routing_metrics
+)
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', '4'))
+
+
+async def keep_session(conn) -> None:
+    # pooled connections only run plain reads, skip the RESET ALL round trip on every release
+    return None
+
+
+def async_enabled() -> bool:
+    return os.environ.get('HANDLER_MODE') == 'async' and asyncpg is not None
+
+
+class AsyncQueryRunner:
+    '''
+    Runs independent statements concurrently, each on its own pooled asyncpg connection
+    The event loop lives on a daemon thread so pools survive between invocations of a warm instance
+    '''
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pools: Dict[str, 'asyncio.Future'] = {}
+        self.lock = threading.Lock()
+
+    def ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='aio-db', daemon=True).start()
+            return self.loop
+
+    async def get_pool(self, dsn: str):
+        pool = self.pools.get(dsn)
+        if pool is None:
+            pool = asyncio.ensure_future(asyncpg.create_pool(
+                dsn, min_size=1, max_size=self.pool_size, reset=keep_session,
+                server_settings={'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS), 'lock_timeout': str(DB_LOCK_TIMEOUT_MS)}
+            ))
+            self.pools[dsn] = pool
+        try:
+            return await asyncio.shield(pool)
+        except Exception:
+            self.pools.pop(dsn, None)
+            raise
+
+    async def fetch(self, pool, sql: str, args: Sequence[Any]) -> List[Dict[str, Any]]:
+        async with pool.acquire() as conn:
+            return [dict(row) for row in await conn.fetch(sql, *args)]
+
+    async def gather(self, dsn: str, queries: Sequence[Tuple[str, Sequence[Any]]]) -> List[List[Dict[str, Any]]]:
+        pool = await self.get_pool(dsn)
+        return list(await asyncio.gather(*(self.fetch(pool, sql, args) for sql, args in queries)))
+
+    def run(self, dsn: str, *queries: Tuple[str, Sequence[Any]]) -> List[List[Dict[str, Any]]]:
+        '''
+        Business: Execute independent read queries concurrently from synchronous handler code
+        Args: dsn - database url; queries - (sql with $1.. placeholders, args) pairs
+        Returns: rows per query as dicts, in the order given
+        Raises: DatabaseUnavailable when the circuit is open or the database fails or times out
+        '''
+        if not breaker.allow():
+            load_metrics['rejected_open'] += 1
+            raise DatabaseUnavailable('circuit_open', breaker.retry_after())
+        request_state.db_used = True
+        loop = self.ensure_loop()
+        try:
+            return asyncio.run_coroutine_threadsafe(self.gather(dsn, queries), loop).result()
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.QueryCanceledError,
+                asyncpg.LockNotAvailableError) as e:
+            timed_out = isinstance(e, (asyncpg.QueryCanceledError, asyncpg.LockNotAvailableError))
+            load_metrics['timeouts' if timed_out else 'db_errors'] += 1
+            breaker.record_failure()
+            raise DatabaseUnavailable('timeout' if timed_out else 'db_error', breaker.retry_after())
+
+
+async_runner = AsyncQueryRunner(ASYNC_POOL_SIZE)
+
+
+def read_dsn(db_url: str, headers: Optional[Dict[str, Any]]) -> str:
+    '''
+    Replica when DATABASE_READ_URL is set, primary for callers holding a fresh consistency token
+    '''
+    read_url = os.environ.get('DATABASE_READ_URL')
+    headers = headers or {}
+    token = headers.get(CONSISTENCY_HEADER) or headers.get(CONSISTENCY_HEADER.lower())
+    if read_url and parse_consistency_token(token) is None:
+        routing_metrics['replica_reads'] += 1
+        request_state.route = 'replica'
+        return read_url
+    routing_metrics['primary_reads'] += 1
+    request_state.route = 'primary'
+    return db_url
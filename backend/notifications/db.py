@@ -0,0 +1,435 @@
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+CONSISTENCY_HEADER = 'X-Consistency-Token'
+CONSISTENCY_TOKEN_TTL = float(os.environ.get('CONSISTENCY_TOKEN_TTL', '30'))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+PREPARED_STATEMENTS_MAX = int(os.environ.get('PREPARED_STATEMENTS_MAX', '64'))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '5000'))
+DB_LOCK_TIMEOUT_MS = int(os.environ.get('DB_LOCK_TIMEOUT_MS', '2000'))
+DB_MAX_CONCURRENCY = int(os.environ.get('DB_MAX_CONCURRENCY', '8'))
+DB_QUEUE_TIMEOUT_MS = int(os.environ.get('DB_QUEUE_TIMEOUT_MS', '100'))
+DB_RETRY_AFTER = int(os.environ.get('DB_RETRY_AFTER', '1'))
+DB_BREAKER_THRESHOLD = int(os.environ.get('DB_BREAKER_THRESHOLD', '5'))
+DB_BREAKER_COOLDOWN = float(os.environ.get('DB_BREAKER_COOLDOWN', '10'))
+
+request_state = threading.local()
+routing_metrics = {'replica_reads': 0, 'primary_reads': 0, 'pinned_reads': 0, 'replica_errors': 0}
+pool_metrics = {'connects': 0, 'reused': 0, 'dropped': 0, 'prepared': 0, 'deallocated': 0, 'executed': 0, 'unprepared': 0}
+load_metrics = {'shed': 0, 'tripped': 0, 'rejected_open': 0, 'timeouts': 0, 'db_errors': 0}
+
+idle_connections: Dict[Any, List['PooledConnection']] = {}
+# sql -> statement name, least recently used first; evicted names are DEALLOCATEd lazily per connection
+statement_names: 'OrderedDict[str, str]' = OrderedDict()
+statement_numbers = itertools.count(1)
+pool_lock = threading.Lock()
+db_slots = threading.BoundedSemaphore(max(DB_MAX_CONCURRENCY, 1))
+
+
+class DatabaseUnavailable(Exception):
+    '''
+    Raised before touching the database when the request is shed or the circuit is open
+    '''
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    '''
+    Opens after DB_BREAKER_THRESHOLD consecutive database failures and fails fast for DB_BREAKER_COOLDOWN seconds
+    Then lets a single probe request through (half-open): success closes it, failure opens it again
+    '''
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None or getattr(request_state, 'probe', False):
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            request_state.probe = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.probe_in_flight or (self.opened_at is None and self.failures >= self.threshold):
+                load_metrics['tripped'] += 1
+                self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def release_probe(self) -> None:
+        '''
+        The probe was shed before it reached the database, let the next request probe instead
+        '''
+        with self.lock:
+            self.probe_in_flight = False
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return DB_RETRY_AFTER
+        return max(1, math.ceil(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+
+breaker = CircuitBreaker(DB_BREAKER_THRESHOLD, DB_BREAKER_COOLDOWN)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    '''
+    Connection that goes back to the idle pool on close() and remembers the statements it has prepared
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_dsn: Optional[str] = None
+        self.prepared = set()
+        self.released_at = time.monotonic()
+        self.holds_slot = False
+
+    def close(self):
+        if self.holds_slot:
+            self.holds_slot = False
+            db_slots.release()
+        if self.pool_dsn is None or self.closed:
+            return super().close()
+        try:
+            self.rollback()
+            if self.readonly:
+                self.readonly = None
+        except psycopg2.Error:
+            pool_metrics['dropped'] += 1
+            return super().close()
+        release(self)
+
+    def discard(self):
+        super().close()
+
+
+class TrackedConnection(PooledConnection):
+    '''
+    Primary connection that remembers the WAL position after each commit while a replica is configured
+    '''
+
+    def commit(self):
+        super().commit()
+        if not os.environ.get('DATABASE_READ_URL'):
+            return
+        cursor = super().cursor()
+        try:
+            cursor.execute("SELECT pg_current_wal_lsn()::text")
+            request_state.commit_lsn = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+        super().commit()
+
+
+def is_stale(conn: PooledConnection) -> bool:
+    '''
+    Idle connections never have unread data, a readable socket means the server closed it
+    Connections idle past DB_POOL_PING_AFTER also get a SELECT 1 round trip
+    '''
+    if conn.closed:
+        return True
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+        if readable:
+            return True
+        if time.monotonic() - conn.released_at > DB_POOL_PING_AFTER:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+    except (psycopg2.Error, OSError, ValueError):
+        return True
+    return False
+
+
+def take_connection(dsn: str, factory) -> PooledConnection:
+    '''
+    Reuse an idle connection of this warm instance, dropping ones the server has closed in the meantime
+    '''
+    while True:
+        with pool_lock:
+            idle = idle_connections.get((dsn, factory))
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = psycopg2.connect(
+                dsn, connection_factory=factory,
+                options=f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS} -c lock_timeout={DB_LOCK_TIMEOUT_MS}'
+            )
+            conn.pool_dsn = dsn
+            pool_metrics['connects'] += 1
+            return conn
+        if is_stale(conn):
+            pool_metrics['dropped'] += 1
+            conn.discard()
+            continue
+        pool_metrics['reused'] += 1
+        return conn
+
+
+def checkout(dsn: str, factory) -> PooledConnection:
+    '''
+    Take one of DB_MAX_CONCURRENCY slots (waiting up to DB_QUEUE_TIMEOUT_MS) and a connection, unless the circuit is open
+    Raises: DatabaseUnavailable when shed or open; the slot is held until close()
+    '''
+    if not db_slots.acquire(timeout=DB_QUEUE_TIMEOUT_MS / 1000):
+        load_metrics['shed'] += 1
+        raise DatabaseUnavailable('overloaded', DB_RETRY_AFTER)
+    if not breaker.allow():
+        db_slots.release()
+        load_metrics['rejected_open'] += 1
+        raise DatabaseUnavailable('circuit_open', breaker.retry_after())
+    request_state.db_used = True
+    try:
+        conn = take_connection(dsn, factory)
+    except Exception:
+        db_slots.release()
+        raise
+    conn.holds_slot = True
+    return conn
+
+
+def release(conn: PooledConnection) -> None:
+    conn.released_at = time.monotonic()
+    with pool_lock:
+        idle = idle_connections.setdefault((conn.pool_dsn, type(conn)), [])
+        if len(idle) < DB_POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.discard()
+
+
+def numbered_placeholders(sql: str) -> str:
+    parts = sql.split('%s')
+    return ''.join(part + (f'${i + 1}' if i < len(parts) - 1 else '') for i, part in enumerate(parts))
+
+
+def execute_prepared(cursor, sql: str, params: Sequence[Any] = ()) -> None:
+    '''
+    Business: cursor.execute for hot statements, PREPAREd once per pooled connection and then run with EXECUTE
+    Args: cursor - cursor of a connection from connect(); sql - statement with %s placeholders; params - values
+    The registry keeps the PREPARED_STATEMENTS_MAX most recently used statements; a connection DEALLOCATEs
+    evicted ones before preparing a new one, so it never holds more than that. Falls back to a plain execute
+    when pooling is off; a reconnect starts with an empty set
+    '''
+    prepared = getattr(cursor.connection, 'prepared', None)
+    if prepared is None or DB_POOL_SIZE <= 0 or PREPARED_STATEMENTS_MAX <= 0:
+        pool_metrics['unprepared'] += 1
+        cursor.execute(sql, params)
+        return
+
+    with pool_lock:
+        name = statement_names.get(sql)
+        if name is None:
+            name = statement_names[sql] = f'hot_{next(statement_numbers)}'
+            while len(statement_names) > PREPARED_STATEMENTS_MAX:
+                statement_names.popitem(last=False)
+        else:
+            statement_names.move_to_end(sql)
+        live = set(statement_names.values()) if name not in prepared else None
+
+    if live is not None:
+        for stale in [n for n in prepared if n not in live]:
+            cursor.execute(f"DEALLOCATE {stale}")
+            prepared.discard(stale)
+            pool_metrics['deallocated'] += 1
+        cursor.execute(f"PREPARE {name} AS {numbered_placeholders(sql)}")
+        prepared.add(name)
+        pool_metrics['prepared'] += 1
+
+    pool_metrics['executed'] += 1
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+
+def begin_request() -> None:
+    request_state.commit_lsn = None
+    request_state.route = None
+    request_state.db_used = False
+    request_state.probe = False
+
+
+def set_budget(cursor, statement_ms: int, lock_ms: Optional[int] = None) -> None:
+    '''
+    Per-endpoint statement_timeout/lock_timeout for the rest of the current transaction
+    '''
+    if lock_ms is None:
+        cursor.execute("SET LOCAL statement_timeout = %s", (statement_ms,))
+    else:
+        cursor.execute("SET LOCAL statement_timeout = %s; SET LOCAL lock_timeout = %s", (statement_ms, lock_ms))
+
+
+def sign(value: str) -> str:
+    secret = os.environ.get('JWT_SECRET', '').encode('utf-8')
+    return hmac.new(secret, value.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+
+def issue_consistency_token(lsn: str) -> str:
+    value = f'{lsn}.{int(time.time())}'
+    return f'{value}.{sign(value)}'
+
+
+def parse_consistency_token(token: Optional[str]) -> Optional[str]:
+    '''
+    Returns: the primary LSN the caller must see, or None for a missing, forged or expired token
+    '''
+    if not token or token.count('.') != 2:
+        return None
+    lsn, issued, signature = token.split('.')
+    if not hmac.compare_digest(signature, sign(f'{lsn}.{issued}')):
+        return None
+    if not issued.isdigit() or time.time() - int(issued) > CONSISTENCY_TOKEN_TTL:
+        return None
+    return lsn
+
+
+def replica_caught_up(conn, lsn: str) -> bool:
+    cursor = conn.cursor()
+    try:
+        # NULL outside recovery: DATABASE_READ_URL points at a primary, nothing to wait for
+        cursor.execute("SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, true)", (lsn,))
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+
+
+def connect(db_url: str, headers: Optional[Dict[str, Any]] = None, read_only: bool = False):
+    '''
+    Business: Open a connection, routing reads to DATABASE_READ_URL unless the caller's consistency token is ahead of it
+    Args: db_url - primary DATABASE_URL; headers - request headers; read_only - True for GET paths
+    Returns: pooled psycopg2 connection, close() hands it back; a replica that is unreachable or behind falls back to the primary
+    '''
+    read_url = os.environ.get('DATABASE_READ_URL')
+    if read_only and read_url:
+        headers = headers or {}
+        lsn = parse_consistency_token(headers.get(CONSISTENCY_HEADER) or headers.get(CONSISTENCY_HEADER.lower()))
+        try:
+            conn = checkout(read_url, PooledConnection)
+        except psycopg2.OperationalError:
+            routing_metrics['replica_errors'] += 1
+        else:
+            if lsn is None or replica_caught_up(conn, lsn):
+                routing_metrics['replica_reads'] += 1
+                request_state.route = 'replica'
+                return conn
+            conn.close()
+            routing_metrics['pinned_reads'] += 1
+
+    if read_only:
+        routing_metrics['primary_reads'] += 1
+    request_state.route = 'primary'
+    return checkout(db_url, TrackedConnection)
+
+
+def connect_maintenance(db_url: str):
+    '''
+    Business: Unpooled primary connection for cron and CLI jobs, outside the request slots and the circuit breaker
+    Returns: psycopg2 connection without the request statement_timeout (long reconciles and bulk jobs run to
+    completion), lock_timeout is kept so DDL doesn't queue behind readers; close() really closes it
+    '''
+    return psycopg2.connect(db_url, options=f'-c statement_timeout=0 -c lock_timeout={DB_LOCK_TIMEOUT_MS}')
+
+
+def consistency_headers() -> Dict[str, str]:
+    '''
+    Returns: X-DB-Route for the connection used and, after a commit, a fresh X-Consistency-Token
+    '''
+    result = {}
+    route = getattr(request_state, 'route', None)
+    if route and os.environ.get('DATABASE_READ_URL'):
+        result['X-DB-Route'] = route
+    lsn = getattr(request_state, 'commit_lsn', None)
+    if lsn:
+        result[CONSISTENCY_HEADER] = issue_consistency_token(lsn)
+        result['Access-Control-Expose-Headers'] = CONSISTENCY_HEADER
+    return result
+
+
+def unavailable_response(reason: str, retry_after: int) -> Dict[str, Any]:
+    return {
+        'statusCode': 503,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+            'Retry-After': str(retry_after),
+            'X-Shed-Reason': reason
+        },
+        'body': json.dumps({'error': 'Сервис перегружен, повторите запрос позже'}),
+        'isBase64Encoded': False
+    }
+
+
+def run_request(handle_request, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Run handle_request with per-request DB state: 503 + Retry-After when shed, circuit open or the DB fails
+    Returns: handler response with X-DB-Route / X-Consistency-Token headers added
+    '''
+    begin_request()
+    try:
+        response = handle_request(event, context)
+    except DatabaseUnavailable as e:
+        if request_state.probe:
+            breaker.release_probe()
+        response = unavailable_response(e.reason, e.retry_after)
+    except psycopg2.OperationalError as e:
+        timed_out = isinstance(e, (psycopg2.errors.QueryCanceled, psycopg2.errors.LockNotAvailable))
+        load_metrics['timeouts' if timed_out else 'db_errors'] += 1
+        breaker.record_failure()
+        response = unavailable_response('timeout' if timed_out else 'db_error', breaker.retry_after())
+    except Exception:
+        if request_state.db_used:
+            breaker.record_success()
+        raise
+    else:
+        if request_state.db_used:
+            breaker.record_success()
+
+    response['headers'] = {**(response.get('headers') or {}), **consistency_headers()}
+    return response
+
+
+def db_stats() -> Dict[str, Any]:
+    return {
+        'routing': routing_metrics,
+        'pool': pool_metrics,
+        'load': {**load_metrics, 'breaker': breaker.state(), 'max_concurrency': DB_MAX_CONCURRENCY}
+    }
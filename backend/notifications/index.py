@@ -2,10 +2,66 @@ import json
 import os
 import jwt
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import connect, run_request, execute_prepared, set_budget
+from aio import async_enabled, async_runner, read_dsn
+from tokens import read_auth_token, verify_token
+from responses import build_projection, compress_response
+from outbox import drain
+from retention import window_start
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+# (statement_timeout ms, lock_timeout ms) for the bulk UPDATEs that touch every row of a user
+BULK_WRITE_BUDGET = (3000, 500)
+
+
+NOTIFICATION_FIELDS = {
+    'id': 'id',
+    'user_id': 'user_id',
+    'type': 'type',
+    'title': 'title',
+    'message': 'message',
+    'playlist_id': 'playlist_id',
+    'is_read': 'is_read',
+    'created_at': 'created_at'
+}
+
+
+def serve_notifications_async(db_url: str, headers: Dict[str, Any], query_params: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    '''
+    Business: HANDLER_MODE=async variant of the notifications GET, list and unread count run concurrently
+    Returns: same response as the synchronous path
+    '''
+    projection = build_projection(query_params.get('fields'), NOTIFICATION_FIELDS, '*')
+    if projection is None:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Недопустимый параметр fields'}),
+            'isBase64Encoded': False
+        }
+    
+    since = window_start()
+    notifications, unread = async_runner.run(
+        read_dsn(db_url, headers),
+        (f"""SELECT {projection} FROM notifications 
+            WHERE user_id = $1 AND created_at >= $2 
+            ORDER BY created_at DESC 
+            LIMIT 50""", (user_id, since)),
+        ("SELECT COUNT(*) as count FROM notifications WHERE user_id = $1 AND is_read = false AND created_at >= $2", (user_id, since))
+    )
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'notifications': notifications,
+            'unread_count': unread[0]['count']
+        }, default=str),
+        'isBase64Encoded': False
+    }
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: User notifications management
     Args: event - dict with httpMethod, headers, queryStringParameters
@@ -20,7 +76,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -39,7 +95,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     headers = event.get('headers', {})
-    auth_token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
+    auth_token = read_auth_token(headers)
     
     if not auth_token:
         return {
@@ -50,7 +106,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     try:
-        payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
+        payload = verify_token(auth_token, jwt_secret)
         user_id = payload['user_id']
     except jwt.ExpiredSignatureError:
         return {
@@ -67,23 +123,40 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(db_url)
+    if method == 'GET' and async_enabled():
+        return serve_notifications_async(db_url, headers, event.get('queryStringParameters') or {}, user_id)
+    
+    # older rows sit in partitions the retention job is about to detach; bounding by month lets the planner skip them
+    since = window_start()
+    conn = connect(db_url, headers, read_only=(method == 'GET'))
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
         if method == 'GET':
-            cursor.execute(
-                """SELECT * FROM notifications 
-                   WHERE user_id = %s 
+            query_params = event.get('queryStringParameters', {}) or {}
+            projection = build_projection(query_params.get('fields'), NOTIFICATION_FIELDS, '*')
+            if projection is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'error': 'Недопустимый параметр fields'}),
+                    'isBase64Encoded': False
+                }
+            
+            execute_prepared(
+                cursor,
+                f"""SELECT {projection} FROM notifications 
+                   WHERE user_id = %s AND created_at >= %s 
                    ORDER BY created_at DESC 
                    LIMIT 50""",
-                (user_id,)
+                (user_id, since)
             )
             notifications = cursor.fetchall()
             
-            cursor.execute(
-                "SELECT COUNT(*) as count FROM notifications WHERE user_id = %s AND is_read = false",
-                (user_id,)
+            execute_prepared(
+                cursor,
+                "SELECT COUNT(*) as count FROM notifications WHERE user_id = %s AND is_read = false AND created_at >= %s",
+                (user_id, since)
             )
             unread_count = cursor.fetchone()['count']
             
@@ -103,18 +176,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             if action == 'mark_read':
                 notification_id = body_data.get('notification_id')
+                set_budget(cursor, *BULK_WRITE_BUDGET)
                 
                 if notification_id:
                     cursor.execute(
                         """UPDATE notifications 
                            SET is_read = true 
-                           WHERE id = %s AND user_id = %s""",
-                        (notification_id, user_id)
+                           WHERE id = %s AND user_id = %s AND created_at >= %s""",
+                        (notification_id, user_id, since)
                     )
                 else:
                     cursor.execute(
-                        "UPDATE notifications SET is_read = true WHERE user_id = %s",
-                        (user_id,)
+                        "UPDATE notifications SET is_read = true WHERE user_id = %s AND is_read = false AND created_at >= %s",
+                        (user_id, since)
                     )
                 
                 conn.commit()
@@ -125,20 +199,42 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'message': 'Уведомления отмечены как прочитанные'}),
                     'isBase64Encoded': False
                 }
+            
+            elif action == 'dispatch':
+                execute_prepared(cursor, "SELECT role FROM users WHERE id = %s", (user_id,))
+                user = cursor.fetchone()
+                
+                if not user or user['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
+                        'isBase64Encoded': False
+                    }
+                
+                result = drain(conn)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'message': 'Очередь уведомлений обработана', **result}),
+                    'isBase64Encoded': False
+                }
         
         elif method == 'DELETE':
             query_params = event.get('queryStringParameters', {}) or {}
             notification_id = query_params.get('id')
+            set_budget(cursor, *BULK_WRITE_BUDGET)
             
             if notification_id:
                 cursor.execute(
-                    "UPDATE notifications SET title = NULL WHERE id = %s AND user_id = %s",
-                    (notification_id, user_id)
+                    "DELETE FROM notifications WHERE id = %s AND user_id = %s AND created_at >= %s",
+                    (notification_id, user_id, since)
                 )
             else:
                 cursor.execute(
-                    "UPDATE notifications SET title = NULL WHERE user_id = %s",
-                    (user_id,)
+                    "DELETE FROM notifications WHERE user_id = %s AND created_at >= %s",
+                    (user_id, since)
                 )
             
             conn.commit()
@@ -159,4 +255,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
\ No newline at end of file
@@ -0,0 +1,118 @@
+import json
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_MAX_BATCHES = int(os.environ.get('OUTBOX_MAX_BATCHES', '10'))
+DELIVERY_CHANNEL = 'notification_delivery'
+
+
+def enqueue_notification(cursor, user_id: int, kind: str, title: str, message: str,
+                         playlist_id: Optional[int] = None) -> None:
+    '''
+    Record a user-facing event in notification_outbox, committed together with the caller's write
+    '''
+    cursor.execute(
+        """INSERT INTO notification_outbox (user_id, type, title, message, playlist_id)
+           VALUES (%s, %s, %s, %s, %s)""",
+        (user_id, kind, title, message, playlist_id)
+    )
+
+
+def coalesce(events: List[Dict[str, Any]]) -> List[Tuple]:
+    '''
+    One notification per (user, type): a lone event is kept as is, several become one entry listing every message
+    Returns: rows for notifications (user_id, type, title, message, playlist_id, created_at)
+    '''
+    groups: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+    for event in events:
+        groups.setdefault((event['user_id'], event['type']), []).append(event)
+
+    rows = []
+    for (user_id, kind), group in groups.items():
+        latest = group[-1]
+        messages = list(dict.fromkeys(e['message'] for e in group if e['message']))
+        playlist_ids = {e['playlist_id'] for e in group}
+        title = latest['title'] if len(messages) <= 1 else f"{latest['title']} ({len(messages)})"
+        rows.append((
+            user_id, kind, title, '\n'.join(messages),
+            latest['playlist_id'] if len(playlist_ids) == 1 else None,
+            latest['created_at']
+        ))
+    return rows
+
+
+def dispatch_batch(conn, batch_size: int = OUTBOX_BATCH_SIZE) -> Dict[str, int]:
+    '''
+    Business: Move one batch of outbox events into notifications and signal delivery
+    Concurrent dispatchers claim disjoint batches via SKIP LOCKED; claim, inserts and pg_notify commit together
+    Returns: {'events': claimed, 'notifications': inserted, 'users': signalled}
+    '''
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cursor.execute(
+            """DELETE FROM notification_outbox
+               WHERE id IN (
+                   SELECT id FROM notification_outbox
+                   ORDER BY id
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING id, user_id, type, title, message, playlist_id, created_at""",
+            (batch_size,)
+        )
+        events = sorted(cursor.fetchall(), key=lambda e: e['id'])
+        if not events:
+            conn.commit()
+            return {'events': 0, 'notifications': 0, 'users': 0}
+
+        rows = coalesce(events)
+        execute_values(
+            cursor,
+            """INSERT INTO notifications (user_id, type, title, message, playlist_id, created_at)
+               VALUES %s""",
+            rows
+        )
+
+        unread: Dict[int, int] = {}
+        for row in rows:
+            unread[row[0]] = unread.get(row[0], 0) + 1
+        cursor.execute(
+            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+            (DELIVERY_CHANNEL, [json.dumps({'user_id': u, 'new': n}) for u, n in unread.items()])
+        )
+        conn.commit()
+        return {'events': len(events), 'notifications': len(rows), 'users': len(unread)}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def drain(conn, batch_size: int = OUTBOX_BATCH_SIZE, max_batches: int = OUTBOX_MAX_BATCHES) -> Dict[str, int]:
+    '''
+    Dispatch batches until the outbox is empty or max_batches ran, events left for the next run stay queued
+    '''
+    totals = {'events': 0, 'notifications': 0, 'users': 0, 'batches': 0}
+    for _ in range(max_batches):
+        result = dispatch_batch(conn, batch_size)
+        totals['batches'] += 1
+        for key, value in result.items():
+            totals[key] += value
+        if result['events'] < batch_size:
+            break
+    return totals
+
+
+if __name__ == '__main__':
+    # cron/worker entry point: python backend/notifications/outbox.py
+    from db import connect_maintenance
+
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    try:
+        print(json.dumps(drain(conn, max_batches=1_000_000)))
+    finally:
+        conn.close()
@@ -0,0 +1,86 @@
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+NOTIFICATION_RETENTION_MONTHS = int(os.environ.get('NOTIFICATION_RETENTION_MONTHS', '6'))
+NOTIFICATION_PARTITIONS_AHEAD = int(os.environ.get('NOTIFICATION_PARTITIONS_AHEAD', '3'))
+# detached partitions are moved here when set; they are only ever dropped with --drop
+NOTIFICATION_ARCHIVE_SCHEMA = os.environ.get('NOTIFICATION_ARCHIVE_SCHEMA', '')
+
+PARTITION_NAME = re.compile(r'^notifications_p(\d{4})(\d{2})$')
+
+
+def window_start(months: int = NOTIFICATION_RETENTION_MONTHS, now: Optional[datetime] = None) -> datetime:
+    '''
+    First day of the oldest retained month; bounding queries by it lets the planner skip older partitions
+    '''
+    now = now or datetime.now()
+    index = now.year * 12 + now.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def run_retention(conn, months: int = NOTIFICATION_RETENTION_MONTHS, ahead: int = NOTIFICATION_PARTITIONS_AHEAD,
+                  archive_schema: str = NOTIFICATION_ARCHIVE_SCHEMA, drop: bool = False) -> Dict[str, Any]:
+    '''
+    Business: Create upcoming monthly partitions and detach the ones that fell out of the retention window
+    Args: months - full months kept besides the current one; ahead - future months to pre-create;
+          archive_schema - move detached partitions there; drop - delete expired rows for good (ignored with archive_schema)
+    Detached months stay as standalone tables unless drop is set: they may still hold unread notifications
+    Returns: {'created': n, 'detached': [names], 'archived': bool, 'dropped': bool, 'default_purged': n}
+    '''
+    drop = drop and not archive_schema
+    cutoff = window_start(months)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT ensure_notification_partitions(date_trunc('month', LOCALTIMESTAMP)::date, %s)",
+            (ahead + 1,)
+        )
+        created = cursor.fetchone()[0]
+
+        cursor.execute(
+            """SELECT c.relname FROM pg_inherits i
+               JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent = 'notifications'::regclass
+               ORDER BY c.relname"""
+        )
+        expired = []
+        for (name,) in cursor.fetchall():
+            match = PARTITION_NAME.match(name)
+            if match and datetime(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+                expired.append(name)
+
+        for name in expired:
+            cursor.execute(f'ALTER TABLE notifications DETACH PARTITION "{name}"')
+            if archive_schema:
+                cursor.execute(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"')
+            elif drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+
+        default_purged = 0
+        if drop:
+            cursor.execute("DELETE FROM notifications_default WHERE created_at < %s", (cutoff,))
+            default_purged = cursor.rowcount
+
+        conn.commit()
+        return {'created': created, 'detached': expired, 'archived': bool(archive_schema), 'dropped': drop,
+                'default_purged': default_purged}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    # daily cron entry point: python backend/notifications/retention.py [--drop]
+    import sys
+    from db import connect_maintenance
+
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    try:
+        print(json.dumps(run_retention(conn, drop='--drop' in sys.argv)))
+    finally:
+        conn.close()
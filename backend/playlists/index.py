@@ -1,11 +1,419 @@
 import json
 import os
+import base64
+import time
 import jwt
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from psycopg2.extras import RealDictCursor, execute_values
+from cache import ReadThroughCache, ProfileCache, make_shared_cache
+from db import connect, run_request, execute_prepared, set_budget, db_stats
+from aio import async_enabled, async_runner, read_dsn
+from tokens import read_auth_token, verify_token, token_cache
+from responses import build_projection, compress_response
+from ratelimit import RateLimiter, make_shared_buckets
+from stats import bump_stats
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COLUMNAR_MEDIA_TYPE = 'application/vnd.columnar+json'
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+
+
+def negotiate_format(headers: Dict[str, Any], query_params: Dict[str, Any]) -> str:
+    '''
+    Pick wire format for list responses from ?format= or Accept header
+    Returns: 'json' (default), 'columnar' or 'msgpack' (columnar rows packed with MessagePack)
+    '''
+    requested = (query_params.get('format') or '').lower()
+    if not requested:
+        accept = headers.get('Accept') or headers.get('accept') or ''
+        if MSGPACK_MEDIA_TYPE in accept:
+            requested = 'msgpack'
+        elif COLUMNAR_MEDIA_TYPE in accept:
+            requested = 'columnar'
+    
+    if requested == 'msgpack' and msgpack is None:
+        requested = 'columnar'
+    
+    return requested if requested in ('columnar', 'msgpack') else 'json'
+
+
+def encode_rows(cursor, rows: List[Dict[str, Any]], wire_format: str) -> Any:
+    '''
+    Encode fetched rows: list of dicts for json, column names once plus row arrays otherwise
+    '''
+    if wire_format == 'json':
+        return [dict(r) for r in rows]
+    
+    return {
+        'columns': list(rows[0].keys()) if rows else [column.name for column in cursor.description],
+        'rows': [list(r.values()) for r in rows]
+    }
+
+
+def list_response(payload: Dict[str, Any], wire_format: str) -> Dict[str, Any]:
+    '''
+    Build 200 response for a list payload in the negotiated wire format
+    '''
+    headers = {'Access-Control-Allow-Origin': '*', 'Vary': 'Accept'}
+    
+    if wire_format == 'msgpack':
+        headers['Content-Type'] = MSGPACK_MEDIA_TYPE
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': base64.b64encode(msgpack.packb(payload, default=str)).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    
+    headers['Content-Type'] = COLUMNAR_MEDIA_TYPE if wire_format == 'columnar' else 'application/json'
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json.dumps(payload, default=str),
+        'isBase64Encoded': False
+    }
+
+
+PLAYLIST_FIELDS = {
+    'id': 'p.id',
+    'user_id': 'p.user_id',
+    'title': 'p.title',
+    'description': 'p.description',
+    'is_public': 'p.is_public',
+    'status': 'p.status',
+    'cover_image_url': 'p.cover_image_url',
+    'moderation_comment': 'p.moderation_comment',
+    'moderated_at': 'p.moderated_at',
+    'moderated_by': 'p.moderated_by',
+    'created_at': 'p.created_at',
+    'updated_at': 'p.updated_at',
+    'author_name': 'u.username',
+    'movies_count': '(SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id)'
+}
+
+PLAYLIST_DEFAULT_PROJECTION = """p.*, u.username as author_name,
+                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count"""
+
+PLAYLIST_PROFILE_FIELDS = {'author_name': 'username'}
+
+
+def split_profile_fields(fields_param: Optional[str], profile_fields: Dict[str, str]) -> Tuple[Optional[str], List[str], bool]:
+    '''
+    Separate fields served from the profile cache from the SQL-projected ones
+    Returns: (fields for build_projection, requested profile fields, whether user_id was added only for the lookup)
+    '''
+    if not fields_param:
+        return None, list(profile_fields), False
+    
+    names = [f.strip() for f in fields_param.split(',') if f.strip()]
+    if not names:
+        return fields_param, [], False
+    
+    profile_names = [name for name in names if name in profile_fields]
+    sql_names = [name for name in names if name not in profile_fields]
+    strip_user_id = bool(profile_names) and 'user_id' not in sql_names
+    if strip_user_id:
+        sql_names.append('user_id')
+    return ','.join(sql_names), profile_names, strip_user_id
+
+
+def attach_profiles(rows: List[Dict[str, Any]], profiles: Dict[int, Dict[str, Any]], profile_fields: Dict[str, str],
+                    names: List[str], strip_user_id: bool) -> None:
+    '''
+    Fill author fields on rows from cached profiles instead of a JOIN on users
+    '''
+    for row in rows:
+        profile = profiles.get(row['user_id']) or {}
+        for name in names:
+            row[name] = profile.get(profile_fields[name])
+        if strip_user_id:
+            del row['user_id']
+
+
+def request_viewer(headers: Dict[str, Any], jwt_secret: str) -> Optional[int]:
+    '''
+    Authenticated viewer of a public GET, None for anonymous requests and bad tokens
+    '''
+    auth_token = read_auth_token(headers)
+    if not auth_token:
+        return None
+    try:
+        return verify_token(auth_token, jwt_secret)['user_id']
+    except jwt.InvalidTokenError:
+        return None
+
+
+def saved_overlay(cursor, viewer_id: int, owner_id: Optional[str] = None) -> List[int]:
+    '''
+    Ids of the listed playlists the viewer has saved: one semi-join probing saved_playlists (user_id, playlist_id)
+    Args: owner_id - the ?user_id= list, None for the public feed
+    '''
+    if owner_id is None:
+        execute_prepared(
+            cursor,
+            """SELECT p.id FROM playlists p
+               WHERE p.is_public = true AND p.status = 'approved'
+               AND EXISTS (SELECT 1 FROM saved_playlists sp WHERE sp.user_id = %s AND sp.playlist_id = p.id)""",
+            (viewer_id,)
+        )
+    else:
+        execute_prepared(
+            cursor,
+            """SELECT p.id FROM playlists p
+               WHERE p.user_id = %s
+               AND EXISTS (SELECT 1 FROM saved_playlists sp WHERE sp.user_id = %s AND sp.playlist_id = p.id)""",
+            (owner_id, viewer_id)
+        )
+    return [row['id'] for row in cursor.fetchall()]
+
+
+def with_overlay(response: Dict[str, Any], overlay: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Add per-viewer keys next to a shared list payload, the cached body itself is reused as is
+    '''
+    if response['isBase64Encoded']:
+        payload = msgpack.unpackb(base64.b64decode(response['body']))
+        payload.update(overlay)
+        body = base64.b64encode(msgpack.packb(payload, default=str)).decode('ascii')
+    else:
+        body = f"{response['body'][:-1]}, {json.dumps(overlay)[1:]}"
+    return {**response, 'headers': {**response['headers'], 'Vary': 'Accept, X-Auth-Token'}, 'body': body}
+
+
+FEED_CACHE_TTL = float(os.environ.get('FEED_CACHE_TTL', '300'))
+FEED_VERSION_TTL = float(os.environ.get('FEED_VERSION_TTL', '2'))
+# statement_timeout for the unpaginated feed and per-user playlist scans
+PLAYLIST_SCAN_TIMEOUT_MS = int(os.environ.get('PLAYLIST_SCAN_TIMEOUT_MS', '2000'))
+
+feed_cache = ReadThroughCache(
+    'playlist_feed',
+    int(os.environ.get('FEED_CACHE_SIZE', '64')),
+    FEED_CACHE_TTL,
+    make_shared_cache()
+)
+feed_version: Dict[str, Any] = {'value': None, 'checked_at': 0.0}
+
+profile_cache = ProfileCache(
+    int(os.environ.get('PROFILE_CACHE_SIZE', '1000')),
+    float(os.environ.get('PROFILE_CACHE_TTL', '30')),
+    float(os.environ.get('PROFILE_SHARED_CACHE_TTL', '3600')),
+    make_shared_cache()
+)
+
+# fractional ordering keys for playlist_movies.position: new rows land POSITION_GAP apart,
+# a move takes the midpoint of its neighbours and renumbers the playlist once the gap gets below POSITION_MIN_GAP
+POSITION_GAP = 1024.0
+POSITION_MIN_GAP = float(os.environ.get('POSITION_MIN_GAP', str(2 ** -10)))
+
+# (capacity, period seconds) per user, override with RATE_LIMITS="playlist_create=10/3600,..."
+rate_limiter = RateLimiter({
+    'playlist_create': (10, 3600),
+    'playlist_add_movie': (60, 60),
+    'playlist_save': (30, 60)
+}, make_shared_buckets())
+
+
+def apply_order(cursor, playlist_id: int, movie_ids: List[int]) -> int:
+    '''
+    Write a whole new movie order in one UPDATE ... FROM (VALUES ...), keys evenly spaced by POSITION_GAP
+    Returns: number of rows whose position actually changed
+    '''
+    if not movie_ids:
+        return 0
+    execute_values(
+        cursor,
+        """UPDATE playlist_movies pm
+           SET position = v.position
+           FROM (VALUES %s) AS v(playlist_id, movie_id, position)
+           WHERE pm.playlist_id = v.playlist_id AND pm.movie_id = v.movie_id
+           AND pm.position IS DISTINCT FROM v.position""",
+        [(playlist_id, movie_id, (i + 1) * POSITION_GAP) for i, movie_id in enumerate(movie_ids)],
+        template='(%s::int, %s::int, %s::float8)',
+        page_size=len(movie_ids)
+    )
+    return cursor.rowcount
+
+
+def position_between(positions: List[float], index: int) -> Optional[float]:
+    '''
+    Key that sorts at index among the ordered positions of the other rows
+    Returns: None when the neighbours are closer than POSITION_MIN_GAP and the playlist needs renumbering
+    '''
+    if not positions:
+        return POSITION_GAP
+    if index == 0:
+        return positions[0] - POSITION_GAP
+    if index == len(positions):
+        return positions[-1] + POSITION_GAP
+    low, high = positions[index - 1], positions[index]
+    if high - low < POSITION_MIN_GAP:
+        return None
+    return (low + high) / 2
+
+
+def read_feed_version(get_cursor: Callable[[], Any]) -> int:
+    '''
+    Current public feed version from cache_versions, re-read at most every FEED_VERSION_TTL seconds
+    '''
+    now = time.monotonic()
+    if feed_version['value'] is None or now - feed_version['checked_at'] > FEED_VERSION_TTL:
+        cursor = get_cursor()
+        execute_prepared(cursor, "SELECT version FROM cache_versions WHERE name = 'playlist_feed'")
+        row = cursor.fetchone()
+        feed_version['value'] = row['version'] if row else 0
+        feed_version['checked_at'] = now
+    return feed_version['value']
+
+
+def bump_feed_version(cursor) -> None:
+    '''
+    Invalidate cached public feed pages, must run inside the write transaction
+    '''
+    cursor.execute(
+        "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'playlist_feed'"
+    )
+    feed_version['value'] = None
+
+
+def serve_public_feed(db_url: str, headers: Dict[str, Any], query_params: Dict[str, Any],
+                      viewer_id: Optional[int] = None) -> Dict[str, Any]:
+    '''
+    Public approved playlist feed through the read-through cache, connects only on version check or miss
+    Signed-in viewers get saved_ids on top of the shared cached page
+    '''
+    # one cache entry per field set: order and repeats in ?fields= don't matter, unknown names are rejected below
+    fields = ','.join(sorted({f.strip() for f in (query_params.get('fields') or '').split(',') if f.strip()}))
+    projection = build_projection(fields, PLAYLIST_FIELDS, PLAYLIST_DEFAULT_PROJECTION)
+    if projection is None:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Недопустимый параметр fields'}),
+            'isBase64Encoded': False
+        }
+    
+    wire_format = negotiate_format(headers, query_params)
+    db: Dict[str, Any] = {}
+    
+    def get_cursor():
+        if 'cursor' not in db:
+            db['conn'] = connect(db_url, headers, read_only=True)
+            db['cursor'] = db['conn'].cursor(cursor_factory=RealDictCursor)
+        return db['cursor']
+    
+    def load_feed():
+        cursor = get_cursor()
+        set_budget(cursor, PLAYLIST_SCAN_TIMEOUT_MS)
+        cursor.execute(
+            f"""SELECT {projection}
+               FROM playlists p
+               LEFT JOIN users u ON p.user_id = u.id
+               WHERE p.is_public = true AND p.status = 'approved'
+               ORDER BY p.created_at DESC"""
+        )
+        return list_response({'playlists': encode_rows(cursor, cursor.fetchall(), wire_format)}, wire_format)
+    
+    try:
+        version = read_feed_version(get_cursor)
+        cache_key = f"v{version}:{wire_format}:{fields or '*'}"
+        response, source = feed_cache.get_or_load(cache_key, load_feed)
+        if viewer_id:
+            response = with_overlay(response, {'saved_ids': saved_overlay(get_cursor(), viewer_id)})
+    finally:
+        if 'cursor' in db:
+            db['cursor'].close()
+            db['conn'].close()
+    
+    return {**response, 'headers': {**response['headers'], 'X-Cache': source.upper()}}
+
+
+def serve_cache_stats(db_url: str, headers: Dict[str, Any], viewer_id: Optional[int]) -> Dict[str, Any]:
+    '''
+    Business: Cache, pool and rate-limit counters of this warm instance, admins only
+    Returns: {'playlist_feed', 'profiles', 'tokens', 'db', 'rate_limit'}
+    '''
+    if viewer_id is None:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Требуется авторизация'}),
+            'isBase64Encoded': False
+        }
+    
+    conn = connect(db_url, headers, read_only=True)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        execute_prepared(cursor, "SELECT role FROM users WHERE id = %s", (viewer_id,))
+        user = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    if not user or user['role'] != 'admin':
+        return {
+            'statusCode': 403,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Доступ запрещён. Требуются права администратора'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({'playlist_feed': feed_cache.stats(), 'profiles': profile_cache.stats(), 'tokens': token_cache.stats(), 'db': db_stats(), 'rate_limit': rate_limiter.stats()}),
+        'isBase64Encoded': False
+    }
+
+
+def serve_playlist_async(db_url: str, headers: Dict[str, Any], playlist_id: str, current_user_id: Optional[int]) -> Dict[str, Any]:
+    '''
+    Business: HANDLER_MODE=async variant of the playlist detail GET, playlist and its movies run concurrently
+    Returns: same response as the synchronous path; movies are discarded when the playlist is not visible
+    '''
+    if not str(playlist_id).isdigit():
+        return {
+            'statusCode': 404,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Подборка не найдена'}),
+            'isBase64Encoded': False
+        }
+    
+    playlists, movies = async_runner.run(
+        read_dsn(db_url, headers),
+        ("""SELECT p.*, u.username as author_name,
+            (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count,
+            EXISTS (SELECT 1 FROM saved_playlists sp WHERE sp.user_id = $2 AND sp.playlist_id = p.id) as is_saved
+            FROM playlists p
+            LEFT JOIN users u ON p.user_id = u.id
+            WHERE p.id = $1 AND (p.status = 'approved' AND p.is_public = true OR p.user_id = $2)""",
+         (int(playlist_id), current_user_id or 0)),
+        ("SELECT * FROM playlist_movies WHERE playlist_id = $1 ORDER BY position, added_at", (int(playlist_id),))
+    )
+    
+    if not playlists:
+        return {
+            'statusCode': 404,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'error': 'Подборка не найдена'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+        'body': json.dumps({
+            'playlist': playlists[0],
+            'movies': movies
+        }, default=str),
+        'isBase64Encoded': False
+    }
+
+
+def handle_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage user movie playlists
     Args: event - dict with httpMethod, body, headers, queryStringParameters
@@ -20,7 +428,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Consistency-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -41,7 +449,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     headers = event.get('headers', {})
     query_params = event.get('queryStringParameters', {}) or {}
     
-    conn = psycopg2.connect(db_url)
+    if method == 'GET' and query_params.get('action') == 'cache_stats':
+        return serve_cache_stats(db_url, headers, request_viewer(headers, jwt_secret))
+    
+    if method == 'GET' and not query_params.get('id') and not query_params.get('user_id') and query_params.get('action') != 'saved':
+        return serve_public_feed(db_url, headers, query_params, request_viewer(headers, jwt_secret))
+    
+    if method == 'GET' and query_params.get('id') and async_enabled():
+        return serve_playlist_async(db_url, headers, query_params['id'], request_viewer(headers, jwt_secret))
+    
+    conn = connect(db_url, headers, read_only=(method == 'GET'))
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -50,14 +467,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             user_filter = query_params.get('user_id')
             action = query_params.get('action')
             
-            current_user_id = None
-            auth_token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
-            if auth_token:
-                try:
-                    payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
-                    current_user_id = payload['user_id']
-                except:
-                    pass
+            current_user_id = request_viewer(headers, jwt_secret)
             
             if action == 'saved':
                 if not current_user_id:
@@ -68,7 +478,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cursor.execute(
+                execute_prepared(
+                    cursor,
                     "SELECT playlist_id FROM saved_playlists WHERE user_id = %s",
                     (current_user_id,)
                 )
@@ -82,13 +493,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             if playlist_id:
-                cursor.execute(
+                execute_prepared(
+                    cursor,
                     """SELECT p.*, u.username as author_name,
-                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
+                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count,
+                       EXISTS (SELECT 1 FROM saved_playlists sp WHERE sp.user_id = %s AND sp.playlist_id = p.id) as is_saved
                        FROM playlists p
                        LEFT JOIN users u ON p.user_id = u.id
                        WHERE p.id = %s AND (p.status = 'approved' AND p.is_public = true OR p.user_id = %s)""",
-                    (playlist_id, current_user_id or 0)
+                    (current_user_id or 0, playlist_id, current_user_id or 0)
                 )
                 playlist = cursor.fetchone()
                 
@@ -100,7 +513,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cursor.execute(
+                execute_prepared(
+                    cursor,
                     "SELECT * FROM playlist_movies WHERE playlist_id = %s ORDER BY position, added_at",
                     (playlist_id,)
                 )
@@ -116,79 +530,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            elif action == 'saved':
-                auth_token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
-                
-                if not auth_token:
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                        'body': json.dumps({'error': 'Требуется авторизация'}),
-                        'isBase64Encoded': False
-                    }
-                
-                try:
-                    payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
-                    user_id = payload['user_id']
-                except:
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                        'body': json.dumps({'error': 'Неверный токен'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cursor.execute(
-                    """SELECT sp.id, sp.playlist_id, sp.saved_at,
-                       p.title as playlist_title, p.description as playlist_description,
-                       u.username as author_name,
-                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
-                       FROM saved_playlists sp
-                       JOIN playlists p ON sp.playlist_id = p.id
-                       LEFT JOIN users u ON p.user_id = u.id
-                       WHERE sp.user_id = %s
-                       ORDER BY sp.saved_at DESC""",
-                    (user_id,)
-                )
-                saved = cursor.fetchall()
-                
+            sql_fields, profile_names, strip_user_id = split_profile_fields(query_params.get('fields'), PLAYLIST_PROFILE_FIELDS)
+            projection = build_projection(
+                sql_fields, PLAYLIST_FIELDS,
+                "p.*, (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count"
+            )
+            if projection is None:
                 return {
-                    'statusCode': 200,
+                    'statusCode': 400,
                     'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                    'body': json.dumps({'saved': [dict(s) for s in saved]}, default=str),
+                    'body': json.dumps({'error': 'Недопустимый параметр fields'}),
                     'isBase64Encoded': False
                 }
             
-            elif user_filter:
-                cursor.execute(
-                    """SELECT p.*, u.username as author_name,
-                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
-                       FROM playlists p
-                       LEFT JOIN users u ON p.user_id = u.id
-                       WHERE p.user_id = %s
-                       ORDER BY p.created_at DESC""",
-                    (user_filter,)
-                )
-            else:
-                cursor.execute(
-                    """SELECT p.*, u.username as author_name,
-                       (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
-                       FROM playlists p
-                       LEFT JOIN users u ON p.user_id = u.id
-                       WHERE p.is_public = true AND p.status = 'approved'
-                       ORDER BY p.created_at DESC"""
-                )
+            set_budget(cursor, PLAYLIST_SCAN_TIMEOUT_MS)
+            execute_prepared(
+                cursor,
+                f"""SELECT {projection}
+                   FROM playlists p
+                   WHERE p.user_id = %s
+                   ORDER BY p.created_at DESC""",
+                (user_filter,)
+            )
             
             playlists = cursor.fetchall()
+            if profile_names and playlists:
+                profiles = profile_cache.get_many(lambda: cursor, [user_filter])
+                attach_profiles(playlists, profiles, PLAYLIST_PROFILE_FIELDS, profile_names, strip_user_id)
+            wire_format = negotiate_format(headers, query_params)
+            payload = {'playlists': encode_rows(cursor, playlists, wire_format)}
+            if current_user_id:
+                payload['saved_ids'] = saved_overlay(cursor, current_user_id, user_filter)
             
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'playlists': [dict(p) for p in playlists]}, default=str),
-                'isBase64Encoded': False
-            }
+            return list_response(payload, wire_format)
         
-        auth_token = headers.get('x-auth-token') or headers.get('X-Auth-Token')
+        auth_token = read_auth_token(headers)
         
         if not auth_token:
             return {
@@ -199,7 +575,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         try:
-            payload = jwt.decode(auth_token, jwt_secret, algorithms=['HS256'])
+            payload = verify_token(auth_token, jwt_secret)
             user_id = payload['user_id']
         except jwt.ExpiredSignatureError:
             return {
@@ -220,6 +596,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body_data = json.loads(event.get('body', '{}'))
             action = body_data.get('action')
             
+            if action in ('create', 'add_movie', 'save'):
+                limited = rate_limiter.check(f'playlist_{action}', user_id)
+                if limited:
+                    return limited
+            
             if action == 'create':
                 title = body_data.get('title', '').strip()
                 description = body_data.get('description', '').strip()
@@ -240,6 +621,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     (user_id, title, description, is_public, cover_image_url)
                 )
                 playlist = cursor.fetchone()
+                bump_stats(cursor, user_id, playlists_count=1)
                 conn.commit()
                 
                 return {
@@ -264,6 +646,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     "INSERT INTO saved_playlists (user_id, playlist_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
                     (user_id, playlist_id)
                 )
+                bump_stats(cursor, user_id, saved_playlists_count=cursor.rowcount)
                 conn.commit()
                 
                 return {
@@ -311,13 +694,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 cursor.execute(
                     """INSERT INTO playlist_movies 
                        (playlist_id, movie_id, movie_title, movie_title_en, movie_genre, movie_rating, 
-                        movie_year, movie_director, movie_image, movie_cover_url, movie_description)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        movie_year, movie_director, movie_image, movie_cover_url, movie_description, position)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                               (SELECT COALESCE(MAX(position), 0) + %s FROM playlist_movies WHERE playlist_id = %s))
                        RETURNING *""",
                     (playlist_id, movie_id or 0, movie_title, movie_title_en, movie_genre, movie_rating, 
-                     movie_year, movie_director, movie_image, movie_cover_url, movie_description)
+                     movie_year, movie_director, movie_image, movie_cover_url, movie_description,
+                     POSITION_GAP, playlist_id)
                 )
                 movie = cursor.fetchone()
+                bump_feed_version(cursor)
                 conn.commit()
                 
                 return {
@@ -326,6 +712,92 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'movie': dict(movie) if movie else None}, default=str),
                     'isBase64Encoded': False
                 }
+            
+            elif action in ('reorder', 'move'):
+                playlist_id = body_data.get('playlist_id')
+                
+                if not playlist_id:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'playlist_id обязателен'}),
+                        'isBase64Encoded': False
+                    }
+                
+                # row lock on the playlist serialises concurrent reorders of the same list
+                cursor.execute(
+                    "SELECT user_id FROM playlists WHERE id = %s FOR UPDATE",
+                    (playlist_id,)
+                )
+                playlist = cursor.fetchone()
+                
+                if not playlist or playlist['user_id'] != user_id:
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'error': 'Нет доступа к этой подборке'}),
+                        'isBase64Encoded': False
+                    }
+                
+                cursor.execute(
+                    "SELECT movie_id, position FROM playlist_movies WHERE playlist_id = %s ORDER BY position, added_at",
+                    (playlist_id,)
+                )
+                current = cursor.fetchall()
+                current_ids = [row['movie_id'] for row in current]
+                
+                movie_ids, movie_id, after_movie_id = None, None, None
+                try:
+                    if action == 'reorder':
+                        movie_ids = [int(m) for m in body_data.get('movie_ids') or []]
+                    else:
+                        movie_id = int(body_data.get('movie_id'))
+                        if body_data.get('after_movie_id') is not None:
+                            after_movie_id = int(body_data['after_movie_id'])
+                except (TypeError, ValueError):
+                    pass
+                
+                if action == 'reorder':
+                    if movie_ids is None or sorted(movie_ids) != sorted(current_ids):
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'error': 'movie_ids должен содержать каждый фильм подборки ровно один раз'}),
+                            'isBase64Encoded': False
+                        }
+                    updated = apply_order(cursor, int(playlist_id), movie_ids)
+                else:
+                    if movie_id not in current_ids or after_movie_id == movie_id or (
+                            after_movie_id is not None and after_movie_id not in current_ids):
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'error': 'Фильм не найден в подборке'}),
+                            'isBase64Encoded': False
+                        }
+                    
+                    rest = [row for row in current if row['movie_id'] != movie_id]
+                    rest_ids = [row['movie_id'] for row in rest]
+                    index = 0 if after_movie_id is None else rest_ids.index(after_movie_id) + 1
+                    position = position_between([row['position'] for row in rest], index)
+                    
+                    if position is None:
+                        updated = apply_order(cursor, int(playlist_id), rest_ids[:index] + [movie_id] + rest_ids[index:])
+                    else:
+                        cursor.execute(
+                            "UPDATE playlist_movies SET position = %s WHERE playlist_id = %s AND movie_id = %s",
+                            (position, playlist_id, movie_id)
+                        )
+                        updated = cursor.rowcount
+                
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                    'body': json.dumps({'message': 'Порядок фильмов обновлён', 'updated': updated}),
+                    'isBase64Encoded': False
+                }
         
         elif method == 'DELETE':
             playlist_id = query_params.get('id')
@@ -347,6 +819,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     "DELETE FROM saved_playlists WHERE user_id = %s AND playlist_id = %s",
                     (user_id, unsave_playlist_id)
                 )
+                bump_stats(cursor, user_id, saved_playlists_count=-cursor.rowcount)
                 conn.commit()
                 
                 return {
@@ -375,6 +848,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     "DELETE FROM playlist_movies WHERE playlist_id = %s AND movie_id = %s",
                     (playlist_id, movie_id)
                 )
+                bump_feed_version(cursor)
                 conn.commit()
                 
                 return {
@@ -386,7 +860,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             elif playlist_id:
                 cursor.execute(
-                    "SELECT user_id, is_approved FROM playlists WHERE id = %s",
+                    "SELECT user_id, status FROM playlists WHERE id = %s",
                     (playlist_id,)
                 )
                 playlist = cursor.fetchone()
@@ -399,7 +873,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                if playlist['is_approved']:
+                if playlist['status'] == 'approved':
                     return {
                         'statusCode': 403,
                         'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
@@ -408,6 +882,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 
                 cursor.execute("DELETE FROM playlists WHERE id = %s", (playlist_id,))
+                bump_stats(cursor, user_id, playlists_count=-cursor.rowcount)
+                bump_feed_version(cursor)
                 conn.commit()
                 
                 return {
@@ -426,4 +902,15 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: Function entry point, compresses large responses per Accept-Encoding
+    Args: event - dict with httpMethod, body, headers, queryStringParameters
+          context - object with request_id, function_name
+    Returns: HTTP response from handle_request, gzip/brotli encoded when accepted
+    '''
+    response = run_request(handle_request, event, context)
+    return compress_response(event.get('headers') or {}, response)
\ No newline at end of file
@@ -0,0 +1,230 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Set
+from psycopg2.extras import RealDictCursor
+
+STATIC_EXPORT_DIR = os.environ.get('STATIC_EXPORT_DIR', 'static-export')
+STATIC_FEED_PAGE_SIZE = int(os.environ.get('STATIC_FEED_PAGE_SIZE', '50'))
+STATIC_EXPORT_BATCH = 500
+
+MANIFEST_NAME = 'manifest.json'
+
+FEED_QUERY = """SELECT p.*, u.username as author_name,
+                (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
+                FROM playlists p
+                LEFT JOIN users u ON p.user_id = u.id
+                WHERE p.is_public = true AND p.status = 'approved'
+                ORDER BY p.created_at DESC"""
+
+
+def chunks(ids: Sequence[int], size: int = STATIC_EXPORT_BATCH) -> Iterable[List[int]]:
+    for start in range(0, len(ids), size):
+        yield list(ids[start:start + size])
+
+
+def playlist_path(playlist_id: int) -> str:
+    return f'playlists/{playlist_id}.json'
+
+
+def reviews_path(movie_id: int) -> str:
+    return f'movies/{movie_id}/reviews.json'
+
+
+def load_manifest(out_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class StaticWriter:
+    '''
+    Atomic file writes under the export directory, skipping files whose bytes did not change
+    Tracks every file's version (the export cursor of the run that last changed it) for the manifest
+    '''
+
+    def __init__(self, out_dir: str, files: Dict[str, int], version: int):
+        self.out_dir = out_dir
+        self.files = dict(files)
+        self.version = version
+        self.metrics = {'written': 0, 'unchanged': 0, 'removed': 0}
+
+    def write(self, path: str, payload: Any) -> None:
+        data = json.dumps(payload, default=str).encode('utf-8')
+        target = os.path.join(self.out_dir, path)
+        try:
+            with open(target, 'rb') as f:
+                if f.read() == data:
+                    self.metrics['unchanged'] += 1
+                    self.files.setdefault(path, self.version)
+                    return
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(f'{target}.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(f'{target}.tmp', target)
+        self.files[path] = self.version
+        self.metrics['written'] += 1
+
+    def remove(self, path: str) -> None:
+        try:
+            os.remove(os.path.join(self.out_dir, path))
+            self.metrics['removed'] += 1
+        except FileNotFoundError:
+            pass
+        self.files.pop(path, None)
+
+    def write_manifest(self, cursor: int) -> None:
+        self.write(MANIFEST_NAME, {
+            'cursor': cursor,
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'files': {path: version for path, version in sorted(self.files.items()) if path != MANIFEST_NAME}
+        })
+
+
+def export_feed(cursor, writer: StaticWriter, page_size: int) -> None:
+    '''
+    feed/1.json … feed/N.json, each {'playlists': [...], 'next': next page path or null}; pages past the end are removed
+    '''
+    cursor.execute(FEED_QUERY)
+    rows = [dict(r) for r in cursor.fetchall()]
+    pages = max((len(rows) + page_size - 1) // page_size, 1)
+    for page in range(1, pages + 1):
+        writer.write(f'feed/{page}.json', {
+            'playlists': rows[(page - 1) * page_size:page * page_size],
+            'next': f'feed/{page + 1}.json' if page < pages else None
+        })
+    for path in [p for p in writer.files if p.startswith('feed/')]:
+        if int(path[len('feed/'):-len('.json')]) > pages:
+            writer.remove(path)
+
+
+def export_playlists(cursor, writer: StaticWriter, playlist_ids: Iterable[int]) -> None:
+    '''
+    playlists/<id>.json in the playlist detail shape; playlists no longer public and approved lose their file
+    '''
+    for batch in chunks(sorted(set(playlist_ids))):
+        cursor.execute(
+            """SELECT p.*, u.username as author_name,
+               (SELECT COUNT(*) FROM playlist_movies WHERE playlist_id = p.id) as movies_count
+               FROM playlists p
+               LEFT JOIN users u ON p.user_id = u.id
+               WHERE p.id = ANY(%s) AND p.is_public = true AND p.status = 'approved'""",
+            (batch,)
+        )
+        playlists = {row['id']: dict(row) for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT * FROM playlist_movies WHERE playlist_id = ANY(%s) ORDER BY playlist_id, position, added_at",
+            (list(playlists),)
+        )
+        movies: Dict[int, List[Dict[str, Any]]] = {}
+        for row in cursor.fetchall():
+            movies.setdefault(row['playlist_id'], []).append(dict(row))
+
+        for playlist_id in batch:
+            if playlist_id in playlists:
+                writer.write(playlist_path(playlist_id), {
+                    'playlist': playlists[playlist_id],
+                    'movies': movies.get(playlist_id, [])
+                })
+            else:
+                writer.remove(playlist_path(playlist_id))
+
+
+def export_reviews(cursor, writer: StaticWriter, movie_ids: Iterable[int]) -> None:
+    '''
+    movies/<id>/reviews.json with approved reviews, newest first, as the reviews list endpoint returns them
+    '''
+    for batch in chunks(sorted(set(movie_ids))):
+        cursor.execute(
+            """SELECT r.*, u.username, u.avatar_url
+               FROM reviews r
+               LEFT JOIN users u ON r.user_id = u.id
+               WHERE r.movie_id = ANY(%s) AND r.status = 'approved'
+               ORDER BY r.movie_id, r.created_at DESC""",
+            (batch,)
+        )
+        reviews: Dict[int, List[Dict[str, Any]]] = {}
+        for row in cursor.fetchall():
+            reviews.setdefault(row['movie_id'], []).append(dict(row))
+
+        for movie_id in batch:
+            if movie_id in reviews:
+                writer.write(reviews_path(movie_id), reviews[movie_id])
+            else:
+                writer.remove(reviews_path(movie_id))
+
+
+def export_static(conn, out_dir: str = STATIC_EXPORT_DIR, full: bool = False,
+                  page_size: int = STATIC_FEED_PAGE_SIZE) -> Dict[str, Any]:
+    '''
+    Business: Bring the static JSON export up to date, regenerating only files touched since the manifest cursor
+    Args: out_dir - export root (synced to the CDN origin); full - ignore the cursor and rewrite everything
+    Returns: {'cursor', 'full', 'playlists', 'movies', 'written', 'unchanged', 'removed'}
+    The cursor is the xmin of the export's snapshot: every transaction below it has finished and is fully
+    visible, transactions still running are picked up again next run
+    '''
+    manifest = None if full else load_manifest(out_dir)
+    previous = load_manifest(out_dir) if full else manifest
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        conn.rollback()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin")
+        horizon = cursor.fetchone()['xmin']
+        writer = StaticWriter(out_dir, (previous or {}).get('files', {}), horizon)
+
+        playlist_ids: Set[int] = set()
+        movie_ids: Set[int] = set()
+        if manifest is None:
+            cursor.execute("SELECT id FROM playlists WHERE is_public = true AND status = 'approved'")
+            playlist_ids.update(row['id'] for row in cursor.fetchall())
+            cursor.execute("SELECT DISTINCT movie_id FROM reviews WHERE status = 'approved'")
+            movie_ids.update(row['movie_id'] for row in cursor.fetchall())
+            # files from an earlier export whose content is gone
+            for path in list(writer.files):
+                if path.startswith('playlists/'):
+                    playlist_ids.add(int(path[len('playlists/'):-len('.json')]))
+                elif path.startswith('movies/'):
+                    movie_ids.add(int(path.split('/')[1]))
+        else:
+            cursor.execute(
+                "SELECT DISTINCT entity, entity_id FROM public_content_changes WHERE tx_id >= %s",
+                (manifest['cursor'],)
+            )
+            for row in cursor.fetchall():
+                (playlist_ids if row['entity'] == 'playlist' else movie_ids).add(row['entity_id'])
+
+        if manifest is None or playlist_ids:
+            export_feed(cursor, writer, page_size)
+        export_playlists(cursor, writer, playlist_ids)
+        export_reviews(cursor, writer, movie_ids)
+        conn.rollback()
+
+        writer.write_manifest(horizon)
+        cursor.execute("DELETE FROM public_content_changes WHERE tx_id < %s", (horizon,))
+        conn.commit()
+        return {'cursor': horizon, 'full': manifest is None, 'playlists': len(playlist_ids),
+                'movies': len(movie_ids), **writer.metrics}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    # cron entry point: python backend/playlists/static_export.py [--full] [out_dir]
+    import sys
+    from db import connect_maintenance
+
+    args = [arg for arg in sys.argv[1:] if arg != '--full']
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    try:
+        print(json.dumps(export_static(conn, args[0] if args else STATIC_EXPORT_DIR, full='--full' in sys.argv)))
+    finally:
+        conn.close()
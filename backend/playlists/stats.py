@@ -0,0 +1,87 @@
+import json
+import os
+from typing import Dict, Any, Optional
+
+STAT_COLUMNS = ('reviews_count', 'approved_reviews_count', 'playlists_count', 'saved_playlists_count', 'collection_count')
+
+# authoritative value of every counter, recomputed by reconcile()
+STAT_SOURCES = {
+    'reviews_count': "SELECT COUNT(*) FROM reviews r WHERE r.user_id = u.id",
+    'approved_reviews_count': "SELECT COUNT(*) FROM reviews r WHERE r.user_id = u.id AND r.status = 'approved'",
+    'playlists_count': "SELECT COUNT(*) FROM playlists p WHERE p.user_id = u.id",
+    'saved_playlists_count': "SELECT COUNT(*) FROM saved_playlists sp WHERE sp.user_id = u.id",
+    'collection_count': "SELECT COUNT(*) FROM user_collections uc WHERE uc.user_id = u.id"
+}
+
+
+def bump_stats(cursor, user_id: int, **deltas: int) -> None:
+    '''
+    Apply counter deltas to user_stats inside the caller's write transaction, creating the row on first use
+    Args: deltas - STAT_COLUMNS name to signed change, zero deltas are skipped
+    '''
+    changes = [(column, delta) for column, delta in deltas.items() if delta]
+    if not changes:
+        return
+    unknown = [column for column, _ in changes if column not in STAT_COLUMNS]
+    if unknown:
+        raise ValueError(f'unknown user_stats columns: {unknown}')
+
+    columns = ', '.join(column for column, _ in changes)
+    initial = ', '.join('GREATEST(%s, 0)' for _ in changes)
+    updates = ', '.join(f'{column} = GREATEST(user_stats.{column} + %s, 0)' for column, _ in changes)
+    cursor.execute(
+        f"""INSERT INTO user_stats (user_id, {columns}) VALUES (%s, {initial})
+            ON CONFLICT (user_id) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP""",
+        [user_id] + [delta for _, delta in changes] * 2
+    )
+
+
+def reconcile(conn, user_id: Optional[int] = None) -> Dict[str, Any]:
+    '''
+    Business: Recompute user_stats from the source tables and rewrite the rows that drifted
+    Args: user_id - limit to one user, None for everyone
+    Returns: {'checked': users, 'fixed': rows rewritten}
+    '''
+    sources = ', '.join(f'({sql}) AS {column}' for column, sql in STAT_SOURCES.items())
+    drifted = ' OR '.join(f's.{column} IS DISTINCT FROM c.{column}' for column in STAT_COLUMNS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""WITH counted AS (
+                    SELECT u.id AS user_id, {sources}
+                    FROM users u
+                    WHERE %(user_id)s IS NULL OR u.id = %(user_id)s
+                ), fixed AS (
+                    INSERT INTO user_stats (user_id, {', '.join(STAT_COLUMNS)})
+                    SELECT c.user_id, {', '.join(f'c.{column}' for column in STAT_COLUMNS)}
+                    FROM counted c
+                    LEFT JOIN user_stats s ON s.user_id = c.user_id
+                    WHERE s.user_id IS NULL OR {drifted}
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        {', '.join(f'{column} = EXCLUDED.{column}' for column in STAT_COLUMNS)},
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM counted), (SELECT COUNT(*) FROM fixed)""",
+            {'user_id': user_id}
+        )
+        checked, fixed = cursor.fetchone()
+        conn.commit()
+        return {'checked': checked, 'fixed': fixed}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    # reconciliation entry point: python backend/collections/stats.py [user_id]
+    import sys
+    from db import connect_maintenance
+
+    conn = connect_maintenance(os.environ['DATABASE_URL'])
+    try:
+        print(json.dumps(reconcile(conn, int(sys.argv[1]) if len(sys.argv) > 1 else None)))
+    finally:
+        conn.close()
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import jwt
+
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '2048'))
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', '300'))
+
+
+class TokenCache:
+    '''
+    Bounded LRU of verified JWT payloads keyed by token hash, an entry never outlives the token's exp
+    '''
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: 'OrderedDict[str, tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'rejected': 0}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl
+        if isinstance(payload.get('exp'), (int, float)):
+            expires_at = min(expires_at, payload['exp'])
+        with self.lock:
+            self.entries[key] = (expires_at, payload)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics, 'entries': len(self.entries)}
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+def read_auth_token(headers: Optional[Dict[str, Any]]) -> Optional[str]:
+    headers = headers or {}
+    return headers.get('X-Auth-Token') or headers.get('x-auth-token')
+
+
+def verify_token(token: str, secret: str) -> Dict[str, Any]:
+    '''
+    Business: Drop-in for jwt.decode(token, secret, algorithms=['HS256']) that skips re-verifying a token seen recently
+    Args: token - raw JWT from X-Auth-Token; secret - JWT_SECRET (part of the key, so rotating it drops old entries)
+    Returns: payload dict; raises jwt.ExpiredSignatureError / jwt.InvalidTokenError like jwt.decode
+    '''
+    key = hashlib.sha256(f'{secret}\0{token}'.encode('utf-8')).hexdigest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        token_cache.metrics['hits'] += 1
+        return dict(payload)
+
+    token_cache.metrics['misses'] += 1
+    try:
+        payload = jwt.decode(token, secret, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        token_cache.metrics['rejected'] += 1
+        raise
+    token_cache.set(key, payload)
+    return dict(payload)
@@ -0,0 +1,10 @@
+-- Версии кэшируемых данных: запись инкрементирует версию в той же транзакции
+CREATE TABLE IF NOT EXISTS t_p58175694_movie_reviews_platfo.cache_versions (
+    name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p58175694_movie_reviews_platfo.cache_versions (name)
+VALUES ('playlist_feed')
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,19 @@
+-- Эпоха прав пользователя: попадает в JWT и увеличивается при смене роли,
+-- после чего ранее выданные токены с ролью перестают приниматься
+ALTER TABLE t_p58175694_movie_reviews_platfo.users
+ADD COLUMN perm_epoch INTEGER NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION t_p58175694_movie_reviews_platfo.bump_user_perm_epoch()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.role IS DISTINCT FROM OLD.role THEN
+        NEW.perm_epoch := OLD.perm_epoch + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_users_bump_perm_epoch
+BEFORE UPDATE OF role ON t_p58175694_movie_reviews_platfo.users
+FOR EACH ROW
+EXECUTE FUNCTION t_p58175694_movie_reviews_platfo.bump_user_perm_epoch();
@@ -0,0 +1,11 @@
+-- Outbox уведомлений: модерация пишет события в своей транзакции,
+-- диспетчер забирает их пачками (FOR UPDATE SKIP LOCKED) и переносит в notifications
+CREATE TABLE IF NOT EXISTS t_p58175694_movie_reviews_platfo.notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES t_p58175694_movie_reviews_platfo.users(id),
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT,
+    playlist_id INTEGER REFERENCES t_p58175694_movie_reviews_platfo.playlists(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,71 @@
+-- Помесячное секционирование уведомлений по created_at:
+-- старые месяцы отсоединяются целиком (retention.py), а не удаляются построчно
+ALTER TABLE t_p58175694_movie_reviews_platfo.notifications RENAME TO notifications_legacy;
+ALTER SEQUENCE t_p58175694_movie_reviews_platfo.notifications_id_seq OWNED BY NONE;
+
+CREATE TABLE t_p58175694_movie_reviews_platfo.notifications (
+    id INTEGER NOT NULL DEFAULT nextval('t_p58175694_movie_reviews_platfo.notifications_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES t_p58175694_movie_reviews_platfo.users(id),
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    message TEXT,
+    playlist_id INTEGER REFERENCES t_p58175694_movie_reviews_platfo.playlists(id),
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE t_p58175694_movie_reviews_platfo.notifications_id_seq OWNED BY t_p58175694_movie_reviews_platfo.notifications.id;
+
+-- Страховка на случай, если секции не созданы заранее
+CREATE TABLE t_p58175694_movie_reviews_platfo.notifications_default PARTITION OF t_p58175694_movie_reviews_platfo.notifications DEFAULT;
+
+-- Индексы под список, счётчик непрочитанных и mark_read
+CREATE INDEX idx_notifications_user_created ON t_p58175694_movie_reviews_platfo.notifications (user_id, created_at DESC);
+CREATE INDEX idx_notifications_user_unread ON t_p58175694_movie_reviews_platfo.notifications (user_id) WHERE is_read = false;
+
+-- Создаёт секции notifications_pYYYYMM на months месяцев начиная с from_month;
+-- строки, уже попавшие в default-секцию за этот месяц, переносятся в новую секцию
+CREATE OR REPLACE FUNCTION t_p58175694_movie_reviews_platfo.ensure_notification_partitions(from_month DATE, months INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months - 1 LOOP
+        month_start := (date_trunc('month', from_month) + make_interval(months => i))::date;
+        month_end := (month_start + interval '1 month')::date;
+        partition_name := 'notifications_p' || to_char(month_start, 'YYYYMM');
+        CONTINUE WHEN to_regclass('t_p58175694_movie_reviews_platfo.' || partition_name) IS NOT NULL;
+
+        EXECUTE format('CREATE TABLE t_p58175694_movie_reviews_platfo.%I (LIKE t_p58175694_movie_reviews_platfo.notifications INCLUDING DEFAULTS)', partition_name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM t_p58175694_movie_reviews_platfo.notifications_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO t_p58175694_movie_reviews_platfo.%I SELECT * FROM moved',
+            month_start, month_end, partition_name
+        );
+        EXECUTE format(
+            'ALTER TABLE t_p58175694_movie_reviews_platfo.notifications ATTACH PARTITION t_p58175694_movie_reviews_platfo.%I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, month_end
+        );
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT t_p58175694_movie_reviews_platfo.ensure_notification_partitions(
+    COALESCE(MIN(created_at), CURRENT_TIMESTAMP)::date,
+    ((EXTRACT(YEAR FROM CURRENT_TIMESTAMP) - EXTRACT(YEAR FROM COALESCE(MIN(created_at), CURRENT_TIMESTAMP))) * 12
+     + EXTRACT(MONTH FROM CURRENT_TIMESTAMP) - EXTRACT(MONTH FROM COALESCE(MIN(created_at), CURRENT_TIMESTAMP)))::int + 4
+)
+FROM t_p58175694_movie_reviews_platfo.notifications_legacy;
+
+INSERT INTO t_p58175694_movie_reviews_platfo.notifications (id, user_id, type, title, message, playlist_id, is_read, created_at)
+SELECT id, user_id, type, title, message, playlist_id, is_read, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM t_p58175694_movie_reviews_platfo.notifications_legacy
+WHERE title IS NOT NULL;
+
+DROP TABLE t_p58175694_movie_reviews_platfo.notifications_legacy;
@@ -0,0 +1,13 @@
+-- Дробные позиции фильмов в подборке: перемещение меняет одну строку,
+-- а не перенумеровывает всю подборку. Текущий порядок раскладывается с шагом 1024
+ALTER TABLE t_p58175694_movie_reviews_platfo.playlist_movies ALTER COLUMN position TYPE DOUBLE PRECISION;
+
+UPDATE t_p58175694_movie_reviews_platfo.playlist_movies pm
+SET position = ordered.rn * 1024
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY playlist_id ORDER BY position, added_at, id) AS rn
+    FROM t_p58175694_movie_reviews_platfo.playlist_movies
+) ordered
+WHERE pm.id = ordered.id;
+
+CREATE INDEX IF NOT EXISTS idx_playlist_movies_playlist_position ON t_p58175694_movie_reviews_platfo.playlist_movies (playlist_id, position);
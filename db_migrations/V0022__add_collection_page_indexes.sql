@@ -0,0 +1,9 @@
+-- Индексы под постраничную выдачу коллекции (keyset): по дате добавления, по рейтингу,
+-- по названию (C-сортировка, она же обслуживает поиск по префиксу) и по жанру
+CREATE INDEX IF NOT EXISTS idx_collections_user_added ON t_p58175694_movie_reviews_platfo.user_collections (user_id, added_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_collections_user_rating ON t_p58175694_movie_reviews_platfo.user_collections (user_id, (COALESCE(movie_rating, -1)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_collections_user_title ON t_p58175694_movie_reviews_platfo.user_collections (user_id, (lower(movie_title) COLLATE "C"), id);
+CREATE INDEX IF NOT EXISTS idx_collections_user_genre ON t_p58175694_movie_reviews_platfo.user_collections (user_id, movie_genre, added_at DESC, id DESC);
+
+-- Покрывается UNIQUE(user_id, movie_id) и новыми индексами
+DROP INDEX IF EXISTS t_p58175694_movie_reviews_platfo.idx_collections_user_id;
@@ -0,0 +1,21 @@
+-- Счётчики для страницы профиля: ведутся в тех же транзакциях, что и записи
+-- в collections, playlists и moderation; stats.py пересчитывает их при расхождении
+CREATE TABLE IF NOT EXISTS t_p58175694_movie_reviews_platfo.user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES t_p58175694_movie_reviews_platfo.users(id),
+    reviews_count INTEGER NOT NULL DEFAULT 0,
+    approved_reviews_count INTEGER NOT NULL DEFAULT 0,
+    playlists_count INTEGER NOT NULL DEFAULT 0,
+    saved_playlists_count INTEGER NOT NULL DEFAULT 0,
+    collection_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p58175694_movie_reviews_platfo.user_stats (user_id, reviews_count, approved_reviews_count, playlists_count, saved_playlists_count, collection_count)
+SELECT u.id,
+       (SELECT COUNT(*) FROM t_p58175694_movie_reviews_platfo.reviews r WHERE r.user_id = u.id),
+       (SELECT COUNT(*) FROM t_p58175694_movie_reviews_platfo.reviews r WHERE r.user_id = u.id AND r.status = 'approved'),
+       (SELECT COUNT(*) FROM t_p58175694_movie_reviews_platfo.playlists p WHERE p.user_id = u.id),
+       (SELECT COUNT(*) FROM t_p58175694_movie_reviews_platfo.saved_playlists sp WHERE sp.user_id = u.id),
+       (SELECT COUNT(*) FROM t_p58175694_movie_reviews_platfo.user_collections uc WHERE uc.user_id = u.id)
+FROM t_p58175694_movie_reviews_platfo.users u
+ON CONFLICT (user_id) DO NOTHING;
@@ -0,0 +1,25 @@
+-- Готовые JSON-снимки опубликованных статей: список читает только summary, content нужен лишь странице статьи
+CREATE TABLE IF NOT EXISTS t_p58175694_movie_reviews_platfo.blog_post_snapshots (
+    post_id INTEGER PRIMARY KEY REFERENCES t_p58175694_movie_reviews_platfo.blog_posts(id) ON DELETE CASCADE,
+    slug VARCHAR(500) UNIQUE NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    tags TEXT[] NOT NULL DEFAULT '{}',
+    published_at TIMESTAMP NOT NULL,
+    summary TEXT NOT NULL,
+    body TEXT NOT NULL,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_blog_snapshots_published ON t_p58175694_movie_reviews_platfo.blog_post_snapshots (published_at DESC, post_id DESC);
+CREATE INDEX IF NOT EXISTS idx_blog_snapshots_category ON t_p58175694_movie_reviews_platfo.blog_post_snapshots (category, published_at DESC, post_id DESC);
+CREATE INDEX IF NOT EXISTS idx_blog_snapshots_tags ON t_p58175694_movie_reviews_platfo.blog_post_snapshots USING GIN (tags);
+
+-- Собранные страницы списков: scope = all | category:<название> | tag:<тег>, after_key = '' для первой страницы,
+-- иначе курсор последней статьи предыдущей страницы
+CREATE TABLE IF NOT EXISTS t_p58175694_movie_reviews_platfo.blog_list_pages (
+    scope TEXT NOT NULL,
+    after_key VARCHAR(200) NOT NULL,
+    body TEXT NOT NULL,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (scope, after_key)
+);
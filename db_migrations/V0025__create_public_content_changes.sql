@@ -0,0 +1,66 @@
+-- Журнал изменений публичного контента для статической выгрузки (static_export.py).
+-- tx_id — номер транзакции записи: курсор выгрузки — xmin её снимка, поэтому
+-- поздно закоммиченные транзакции не теряются
+CREATE TABLE IF NOT EXISTS t_p58175694_movie_reviews_platfo.public_content_changes (
+    id BIGSERIAL PRIMARY KEY,
+    tx_id BIGINT NOT NULL DEFAULT txid_current(),
+    entity VARCHAR(20) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_public_content_changes_tx ON t_p58175694_movie_reviews_platfo.public_content_changes (tx_id);
+
+-- playlist: подборка стала или перестала быть публичной одобренной, либо изменился её состав;
+-- movie_reviews: изменилась одобренная рецензия на фильм
+CREATE OR REPLACE FUNCTION t_p58175694_movie_reviews_platfo.record_public_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'reviews' THEN
+        IF TG_OP <> 'INSERT' THEN
+            IF OLD.status = 'approved' THEN
+                INSERT INTO t_p58175694_movie_reviews_platfo.public_content_changes (entity, entity_id) VALUES ('movie_reviews', OLD.movie_id);
+            END IF;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            IF NEW.status = 'approved' THEN
+                INSERT INTO t_p58175694_movie_reviews_platfo.public_content_changes (entity, entity_id) VALUES ('movie_reviews', NEW.movie_id);
+            END IF;
+        END IF;
+    ELSIF TG_TABLE_NAME = 'playlists' THEN
+        IF TG_OP <> 'INSERT' THEN
+            IF OLD.status = 'approved' AND OLD.is_public THEN
+                INSERT INTO t_p58175694_movie_reviews_platfo.public_content_changes (entity, entity_id) VALUES ('playlist', OLD.id);
+            END IF;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            IF NEW.status = 'approved' AND NEW.is_public THEN
+                INSERT INTO t_p58175694_movie_reviews_platfo.public_content_changes (entity, entity_id) VALUES ('playlist', NEW.id);
+            END IF;
+        END IF;
+    ELSE
+        IF TG_OP <> 'INSERT' THEN
+            INSERT INTO t_p58175694_movie_reviews_platfo.public_content_changes (entity, entity_id) VALUES ('playlist', OLD.playlist_id);
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.playlist_id <> OLD.playlist_id) THEN
+            INSERT INTO t_p58175694_movie_reviews_platfo.public_content_changes (entity, entity_id) VALUES ('playlist', NEW.playlist_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_reviews_public_change
+AFTER INSERT OR UPDATE OR DELETE ON t_p58175694_movie_reviews_platfo.reviews
+FOR EACH ROW
+EXECUTE FUNCTION t_p58175694_movie_reviews_platfo.record_public_change();
+
+CREATE TRIGGER trg_playlists_public_change
+AFTER INSERT OR UPDATE OR DELETE ON t_p58175694_movie_reviews_platfo.playlists
+FOR EACH ROW
+EXECUTE FUNCTION t_p58175694_movie_reviews_platfo.record_public_change();
+
+CREATE TRIGGER trg_playlist_movies_public_change
+AFTER INSERT OR UPDATE OR DELETE ON t_p58175694_movie_reviews_platfo.playlist_movies
+FOR EACH ROW
+EXECUTE FUNCTION t_p58175694_movie_reviews_platfo.record_public_change();
@@ -0,0 +1,31 @@
+-- Начальные снимки уже опубликованных статей (V0011), чтобы блог отдавал их сразу после деплоя,
+-- без ручного запуска snapshots.py. JSON той же формы, что собирает serialize_post; даты в формате str(datetime).
+-- Страницы списков не строятся: без них чтение идёт по снимкам через keyset, первая публикация соберёт страницы
+WITH source AS (
+    SELECT p.id, p.title, p.slug, p.excerpt, p.content, p.category, p.cover_image, COALESCE(p.tags, '{}') AS tags,
+           p.read_time, p.published_at, p.author_id, u.username AS author_name, u.avatar_url AS author_avatar,
+           to_char(p.published_at, 'YYYY-MM-DD HH24:MI:SS')
+               || CASE WHEN date_part('microseconds', p.published_at)::bigint % 1000000 <> 0
+                       THEN to_char(p.published_at, '.US') ELSE '' END AS published_text,
+           to_char(p.updated_at, 'YYYY-MM-DD HH24:MI:SS')
+               || CASE WHEN date_part('microseconds', p.updated_at)::bigint % 1000000 <> 0
+                       THEN to_char(p.updated_at, '.US') ELSE '' END AS updated_text
+    FROM t_p58175694_movie_reviews_platfo.blog_posts p
+    LEFT JOIN t_p58175694_movie_reviews_platfo.users u ON u.id = p.author_id
+    WHERE p.is_published = true AND p.published_at IS NOT NULL
+),
+summaries AS (
+    SELECT source.*,
+           json_build_object(
+               'id', id, 'title', title, 'slug', slug, 'excerpt', excerpt, 'category', category,
+               'cover_image', cover_image, 'tags', tags, 'read_time', read_time, 'published_at', published_text,
+               'author', json_build_object('id', author_id, 'username', author_name, 'avatar_url', author_avatar)
+           )::text AS summary
+    FROM source
+)
+INSERT INTO t_p58175694_movie_reviews_platfo.blog_post_snapshots (post_id, slug, category, tags, published_at, summary, body)
+SELECT id, slug, category, tags, published_at, summary,
+       left(summary, -1) || ', "content" : ' || to_json(content)::text
+           || ', "updated_at" : ' || COALESCE(to_json(updated_text)::text, 'null') || '}'
+FROM summaries
+ON CONFLICT (post_id) DO NOTHING;
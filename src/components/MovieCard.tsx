@@ -16,9 +16,10 @@ interface MovieCardProps {
     description: string;
     trailer?: string;
   };
+  inCollection?: boolean;
 }
 
-const MovieCard = ({ movie }: MovieCardProps) => {
+const MovieCard = ({ movie, inCollection = false }: MovieCardProps) => {
   const navigate = useNavigate();
   const { toast } = useToast();
   const [trailerOpen, setTrailerOpen] = useState(false);
@@ -60,6 +61,14 @@ const MovieCard = ({ movie }: MovieCardProps) => {
               <span className="text-sm font-bold">{movie.rating}</span>
             </div>
           </div>
+          {inCollection && (
+            <div className="absolute top-4 left-4">
+              <div className="bg-black/80 backdrop-blur-sm px-3 py-1 rounded-full flex items-center gap-1 text-primary">
+                <Icon name="Bookmark" size={14} className="fill-primary" />
+                <span className="text-xs font-medium">В коллекции</span>
+              </div>
+            </div>
+          )}
           <div className="absolute bottom-4 left-4">
             <span className="inline-block px-3 py-1 bg-primary/20 backdrop-blur-sm border border-primary rounded-full text-xs font-medium text-primary">
               {movie.genre}
@@ -1,3 +1,6 @@
+import { applySavedOverlay, decodeColumnar } from './wire';
+import { consistentFetch } from './consistency';
+
 const IS_PREVIEW = window.location.hostname.includes('preview--');
 const USE_MOCK = true;
 console.log('Auth mode:', { hostname: window.location.hostname, IS_PREVIEW, USE_MOCK });
@@ -9,6 +12,16 @@ const PLAYLISTS_API_URL = 'https://functions.poehali.dev/d1c32b2a-126c-4ae1-a4b3
 const MODERATION_API_URL = 'https://functions.poehali.dev/5e9858b0-439e-4bbf-bcbd-e1bc42cc796b';
 const NOTIFICATIONS_API_URL = 'https://functions.poehali.dev/a5fa6d9e-26b8-4f93-b64c-162092c3ce0e';
 
+const PLAYLIST_CARD_FIELDS = 'id,user_id,title,description,cover_image_url,author_name,movies_count,created_at';
+
+export interface UserStats {
+  reviews_count: number;
+  approved_reviews_count: number;
+  playlists_count: number;
+  saved_playlists_count: number;
+  collection_count: number;
+}
+
 export interface User {
   id: number;
   email: string;
@@ -19,6 +32,7 @@ export interface User {
   bio?: string;
   status?: string;
   created_at?: string;
+  stats?: UserStats;
 }
 
 export interface AuthResponse {
@@ -44,7 +58,7 @@ export const authService = {
     }
     
     try {
-      const response = await fetch(AUTH_API_URL, {
+      const response = await consistentFetch(AUTH_API_URL, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -88,7 +102,7 @@ export const authService = {
     }
     
     try {
-      const response = await fetch(AUTH_API_URL, {
+      const response = await consistentFetch(AUTH_API_URL, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -150,7 +164,7 @@ export const authService = {
       const token = this.getToken();
       const url = userId ? `${AUTH_API_URL}?user_id=${userId}` : AUTH_API_URL;
       
-      const response = await fetch(url, {
+      const response = await consistentFetch(url, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -172,7 +186,7 @@ export const authService = {
   async updateProfile(data: Partial<User>): Promise<User> {
     const token = this.getToken();
     
-    const response = await fetch(AUTH_API_URL, {
+    const response = await consistentFetch(AUTH_API_URL, {
       method: 'PUT',
       headers: {
         'Content-Type': 'application/json',
@@ -193,11 +207,12 @@ export const authService = {
 };
 
 export const collectionsService = {
-  async getCollections(): Promise<any[]> {
+  async getCollections(cursor?: string | null): Promise<{ items: any[]; nextCursor: string | null }> {
     try {
       const token = authService.getToken();
+      const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
       
-      const response = await fetch(COLLECTIONS_API_URL, {
+      const response = await consistentFetch(`${COLLECTIONS_API_URL}?format=columnar${query}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -211,9 +226,9 @@ export const collectionsService = {
       }
 
       const data = await response.json();
-      return data.collections || [];
+      return { items: decodeColumnar(data.collections), nextCursor: data.next_cursor || null };
     } catch (error) {
-      return [];
+      return { items: [], nextCursor: null };
     }
   },
 
@@ -227,7 +242,7 @@ export const collectionsService = {
   }): Promise<any> {
     const token = authService.getToken();
     
-    const response = await fetch(COLLECTIONS_API_URL, {
+    const response = await consistentFetch(COLLECTIONS_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -254,7 +269,7 @@ export const collectionsService = {
   async removeFromCollection(movieId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(`${COLLECTIONS_API_URL}?movie_id=${movieId}`, {
+    const response = await consistentFetch(`${COLLECTIONS_API_URL}?movie_id=${movieId}`, {
       method: 'DELETE',
       headers: {
         'Content-Type': 'application/json',
@@ -267,36 +282,92 @@ export const collectionsService = {
       throw new Error(error.error || 'Ошибка удаления из коллекции');
     }
   },
-};
 
-export const playlistsService = {
-  async getPublicPlaylists(): Promise<any[]> {
+  async importCsv(file: File): Promise<{ received: number; imported: number; duplicates: number; skipped: number; errors: { line: number; error: string }[] }> {
+    const token = authService.getToken();
+    
+    const response = await consistentFetch(`${COLLECTIONS_API_URL}?action=import`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'text/csv',
+        'X-Auth-Token': token || '',
+      },
+      body: await file.text(),
+    });
+
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Ошибка импорта');
+    }
+
+    return response.json();
+  },
+
+  async getMembership(movieIds: number[]): Promise<Set<number>> {
+    if (movieIds.length === 0) return new Set();
     try {
-      const response = await fetch(PLAYLISTS_API_URL, {
+      const token = authService.getToken();
+      
+      const response = await consistentFetch(`${COLLECTIONS_API_URL}?action=membership&movie_ids=${movieIds.join(',')}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
+          'X-Auth-Token': token || '',
         },
       });
 
+      if (!response.ok) return new Set();
+
+      const data = await response.json();
+      return new Set<number>(data.collected || []);
+    } catch (error) {
+      return new Set();
+    }
+  },
+};
+
+export const playlistsService = {
+  async getPublicPlaylists(): Promise<any[]> {
+    try {
+      const token = authService.getToken();
+      const headers: any = {
+        'Content-Type': 'application/json',
+      };
+      
+      if (token) {
+        headers['X-Auth-Token'] = token;
+      }
+      
+      const response = await consistentFetch(`${PLAYLISTS_API_URL}?format=columnar&fields=${PLAYLIST_CARD_FIELDS}`, {
+        method: 'GET',
+        headers,
+      });
+
       if (!response.ok) {
         const error = await response.json();
         throw new Error(error.error || 'Ошибка загрузки подборок');
       }
 
       const data = await response.json();
-      return data.playlists || [];
+      return applySavedOverlay(decodeColumnar(data.playlists), data.saved_ids);
     } catch (error) {
       return [];
     }
   },
 
   async getUserPlaylists(userId: number): Promise<any[]> {
-    const response = await fetch(`${PLAYLISTS_API_URL}?user_id=${userId}`, {
+    const token = authService.getToken();
+    const headers: any = {
+      'Content-Type': 'application/json',
+    };
+    
+    if (token) {
+      headers['X-Auth-Token'] = token;
+    }
+    
+    const response = await consistentFetch(`${PLAYLISTS_API_URL}?user_id=${userId}&format=columnar`, {
       method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers,
     });
 
     if (!response.ok) {
@@ -305,7 +376,7 @@ export const playlistsService = {
     }
 
     const data = await response.json();
-    return data.playlists || [];
+    return applySavedOverlay(decodeColumnar(data.playlists), data.saved_ids);
   },
 
   async getPlaylist(id: number): Promise<any> {
@@ -318,7 +389,7 @@ export const playlistsService = {
       headers['X-Auth-Token'] = token;
     }
     
-    const response = await fetch(`${PLAYLISTS_API_URL}?id=${id}`, {
+    const response = await consistentFetch(`${PLAYLISTS_API_URL}?id=${id}`, {
       method: 'GET',
       headers,
     });
@@ -334,7 +405,7 @@ export const playlistsService = {
   async createPlaylist(title: string, description: string, isPublic: boolean = true, coverImageUrl?: string): Promise<any> {
     const token = authService.getToken();
     
-    const response = await fetch(PLAYLISTS_API_URL, {
+    const response = await consistentFetch(PLAYLISTS_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -371,7 +442,7 @@ export const playlistsService = {
   }): Promise<any> {
     const token = authService.getToken();
     
-    const response = await fetch(PLAYLISTS_API_URL, {
+    const response = await consistentFetch(PLAYLISTS_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -404,7 +475,7 @@ export const playlistsService = {
   async removeMovieFromPlaylist(playlistId: number, movieId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(`${PLAYLISTS_API_URL}?id=${playlistId}&movie_id=${movieId}`, {
+    const response = await consistentFetch(`${PLAYLISTS_API_URL}?id=${playlistId}&movie_id=${movieId}`, {
       method: 'DELETE',
       headers: {
         'Content-Type': 'application/json',
@@ -421,7 +492,7 @@ export const playlistsService = {
   async deletePlaylist(playlistId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(`${PLAYLISTS_API_URL}?id=${playlistId}`, {
+    const response = await consistentFetch(`${PLAYLISTS_API_URL}?id=${playlistId}`, {
       method: 'DELETE',
       headers: {
         'Content-Type': 'application/json',
@@ -439,7 +510,7 @@ export const playlistsService = {
     try {
       const token = authService.getToken();
       
-      const response = await fetch(`${PLAYLISTS_API_URL}?action=saved`, {
+      const response = await consistentFetch(`${PLAYLISTS_API_URL}?action=saved`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -462,7 +533,7 @@ export const playlistsService = {
   async savePlaylist(playlistId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(PLAYLISTS_API_URL, {
+    const response = await consistentFetch(PLAYLISTS_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -483,7 +554,7 @@ export const playlistsService = {
   async unsavePlaylist(playlistId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(`${PLAYLISTS_API_URL}?action=unsave&playlist_id=${playlistId}`, {
+    const response = await consistentFetch(`${PLAYLISTS_API_URL}?action=unsave&playlist_id=${playlistId}`, {
       method: 'DELETE',
       headers: {
         'Content-Type': 'application/json',
@@ -502,7 +573,7 @@ export const moderationService = {
   async getPendingPlaylists(): Promise<any[]> {
     const token = authService.getToken();
     
-    const response = await fetch(`${MODERATION_API_URL}?type=playlists&status=pending`, {
+    const response = await consistentFetch(`${MODERATION_API_URL}?type=playlists&status=pending`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -522,7 +593,7 @@ export const moderationService = {
   async getPendingReviews(): Promise<any[]> {
     const token = authService.getToken();
     
-    const response = await fetch(`${MODERATION_API_URL}?type=reviews&status=pending`, {
+    const response = await consistentFetch(`${MODERATION_API_URL}?type=reviews&status=pending`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -542,7 +613,7 @@ export const moderationService = {
   async approvePlaylist(playlistId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(MODERATION_API_URL, {
+    const response = await consistentFetch(MODERATION_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -559,12 +630,14 @@ export const moderationService = {
       const error = await response.json();
       throw new Error(error.error || 'Ошибка одобрения подборки');
     }
+
+    notificationsService.dispatchPending();
   },
 
   async rejectPlaylist(playlistId: number, comment: string): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(MODERATION_API_URL, {
+    const response = await consistentFetch(MODERATION_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -582,12 +655,14 @@ export const moderationService = {
       const error = await response.json();
       throw new Error(error.error || 'Ошибка отклонения подборки');
     }
+
+    notificationsService.dispatchPending();
   },
 
   async approveReview(reviewId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(MODERATION_API_URL, {
+    const response = await consistentFetch(MODERATION_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -604,12 +679,14 @@ export const moderationService = {
       const error = await response.json();
       throw new Error(error.error || 'Ошибка одобрения рецензии');
     }
+
+    notificationsService.dispatchPending();
   },
 
   async rejectReview(reviewId: number, comment: string): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(MODERATION_API_URL, {
+    const response = await consistentFetch(MODERATION_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -627,6 +704,8 @@ export const moderationService = {
       const error = await response.json();
       throw new Error(error.error || 'Ошибка отклонения рецензии');
     }
+
+    notificationsService.dispatchPending();
   },
 };
 
@@ -635,7 +714,7 @@ export const notificationsService = {
     try {
       const token = authService.getToken();
       
-      const response = await fetch(NOTIFICATIONS_API_URL, {
+      const response = await consistentFetch(NOTIFICATIONS_API_URL, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -657,7 +736,7 @@ export const notificationsService = {
   async markAsRead(notificationId?: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(NOTIFICATIONS_API_URL, {
+    const response = await consistentFetch(NOTIFICATIONS_API_URL, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -682,7 +761,7 @@ export const notificationsService = {
       ? `${NOTIFICATIONS_API_URL}?id=${notificationId}`
       : NOTIFICATIONS_API_URL;
     
-    const response = await fetch(url, {
+    const response = await consistentFetch(url, {
       method: 'DELETE',
       headers: {
         'Content-Type': 'application/json',
@@ -695,6 +774,20 @@ export const notificationsService = {
       throw new Error(error.error || 'Ошибка удаления уведомлений');
     }
   },
+
+  dispatchPending(): void {
+    const token = authService.getToken();
+    
+    // moderation only writes to the outbox; ask for delivery without making the moderator wait
+    consistentFetch(NOTIFICATIONS_API_URL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Auth-Token': token || '',
+      },
+      body: JSON.stringify({ action: 'dispatch' }),
+    }).catch(() => undefined);
+  },
 };
 
 export interface Review {
@@ -761,7 +854,7 @@ export const reviewsService = {
     
     try {
       const token = authService.getToken();
-      let url = `${REVIEWS_API_URL}?action=reviews`;
+      let url = `${REVIEWS_API_URL}?action=reviews&format=columnar`;
       
       if (movieId) {
         url += `&movie_id=${movieId}`;
@@ -769,7 +862,7 @@ export const reviewsService = {
         url += `&user_id=${userId}`;
       }
       
-      const response = await fetch(url, {
+      const response = await consistentFetch(url, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -782,7 +875,7 @@ export const reviewsService = {
         throw new Error(error.error || 'Ошибка загрузки рецензий');
       }
 
-      return response.json();
+      return decodeColumnar<Review>(await response.json());
     } catch (error) {
       return [];
     }
@@ -797,7 +890,7 @@ export const reviewsService = {
   }): Promise<Review> {
     const token = authService.getToken();
     
-    const response = await fetch(`${REVIEWS_API_URL}?action=reviews`, {
+    const response = await consistentFetch(`${REVIEWS_API_URL}?action=reviews`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -820,7 +913,7 @@ export const reviewsService = {
   }): Promise<Review> {
     const token = authService.getToken();
     
-    const response = await fetch(`${REVIEWS_API_URL}?action=reviews`, {
+    const response = await consistentFetch(`${REVIEWS_API_URL}?action=reviews`, {
       method: 'PUT',
       headers: {
         'Content-Type': 'application/json',
@@ -843,7 +936,7 @@ export const reviewsService = {
   async deleteReview(reviewId: number): Promise<void> {
     const token = authService.getToken();
     
-    const response = await fetch(`${REVIEWS_API_URL}?action=reviews&review_id=${reviewId}`, {
+    const response = await consistentFetch(`${REVIEWS_API_URL}?action=reviews&review_id=${reviewId}`, {
       method: 'DELETE',
       headers: {
         'Content-Type': 'application/json',
@@ -0,0 +1,30 @@
+const CONSISTENCY_HEADER = 'X-Consistency-Token';
+const STORAGE_KEY = 'consistency_token';
+
+const readToken = (): string | null => {
+  try {
+    return sessionStorage.getItem(STORAGE_KEY);
+  } catch {
+    return null;
+  }
+};
+
+export function rememberConsistency(response: Response): void {
+  const token = response.headers.get(CONSISTENCY_HEADER);
+  if (!token) return;
+  try {
+    sessionStorage.setItem(STORAGE_KEY, token);
+  } catch {
+    // storage unavailable: reads may briefly lag our own writes
+  }
+}
+
+export async function consistentFetch(input: string, init: RequestInit = {}): Promise<Response> {
+  const token = readToken();
+  const headers = new Headers(init.headers);
+  if (token) headers.set(CONSISTENCY_HEADER, token);
+
+  const response = await fetch(input, { ...init, headers });
+  rememberConsistency(response);
+  return response;
+}
@@ -0,0 +1,29 @@
+export interface ColumnarRows {
+  columns: string[];
+  rows: unknown[][];
+}
+
+export const isColumnar = (value: unknown): value is ColumnarRows =>
+  !!value &&
+  typeof value === 'object' &&
+  Array.isArray((value as ColumnarRows).columns) &&
+  Array.isArray((value as ColumnarRows).rows);
+
+export function decodeColumnar<T = any>(value: ColumnarRows | T[] | undefined): T[] {
+  if (!value) return [];
+  if (!isColumnar(value)) return value;
+
+  const { columns, rows } = value;
+  return rows.map((row) => {
+    const item: Record<string, unknown> = {};
+    for (let i = 0; i < columns.length; i++) {
+      item[columns[i]] = row[i];
+    }
+    return item as T;
+  });
+}
+
+export function applySavedOverlay<T extends { id: number }>(items: T[], savedIds: number[] | undefined): (T & { is_saved: boolean })[] {
+  const saved = new Set(savedIds || []);
+  return items.map((item) => ({ ...item, is_saved: saved.has(item.id) }));
+}
@@ -6,7 +6,7 @@ import { Input } from '@/components/ui/input';
 import Icon from '@/components/ui/icon';
 import Notifications from '@/components/Notifications';
 import MovieCard from '@/components/MovieCard';
-import { authService, playlistsService } from '@/lib/auth';
+import { authService, collectionsService, playlistsService } from '@/lib/auth';
 import { useToast } from '@/hooks/use-toast';
 
 const Index = () => {
@@ -15,6 +15,7 @@ const Index = () => {
   const [activeSection, setActiveSection] = useState('Главная');
   const [playlists, setPlaylists] = useState<any[]>([]);
   const [savedPlaylistIds, setSavedPlaylistIds] = useState<Set<number>>(new Set());
+  const [collectedMovieIds, setCollectedMovieIds] = useState<Set<number>>(new Set());
   const isAuthenticated = authService.isAuthenticated();
 
   const navItems = ['Главная', 'Рецензии', 'Подборки', 'Новинки', 'Блог'];
@@ -22,7 +23,7 @@ const Index = () => {
   useEffect(() => {
     loadPlaylists();
     if (isAuthenticated) {
-      loadSavedPlaylists();
+      collectionsService.getMembership(featuredMovies.map((m) => m.id)).then(setCollectedMovieIds);
     }
   }, []);
 
@@ -30,20 +31,12 @@ const Index = () => {
     try {
       const data = await playlistsService.getPublicPlaylists();
       setPlaylists(data.slice(0, 2));
+      setSavedPlaylistIds(new Set(data.filter((p: any) => p.is_saved).map((p: any) => p.id)));
     } catch (error) {
       console.error('Error loading playlists:', error);
     }
   };
 
-  const loadSavedPlaylists = async () => {
-    try {
-      const saved = await playlistsService.getSavedPlaylists();
-      setSavedPlaylistIds(new Set(saved.map((p: any) => p.playlist_id)));
-    } catch (error) {
-      console.error('Error loading saved playlists:', error);
-    }
-  };
-
   const handleToggleSave = async (e: React.MouseEvent, playlistId: number) => {
     e.stopPropagation();
     
@@ -260,7 +253,7 @@ const Index = () => {
 
         <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
           {featuredMovies.map((movie) => (
-            <MovieCard key={movie.id} movie={movie} />
+            <MovieCard key={movie.id} movie={movie} inCollection={collectedMovieIds.has(movie.id)} />
           ))}
         </div>
       </div>
@@ -16,15 +16,13 @@ const Playlists = () => {
 
   useEffect(() => {
     loadPlaylists();
-    if (isAuthenticated) {
-      loadSavedPlaylists();
-    }
   }, []);
 
   const loadPlaylists = async () => {
     try {
       const data = await playlistsService.getPublicPlaylists();
       setPlaylists(data);
+      setSavedPlaylistIds(new Set(data.filter((p: any) => p.is_saved).map((p: any) => p.id)));
     } catch (error) {
       console.error('Error loading playlists:', error);
     } finally {
@@ -32,15 +30,6 @@ const Playlists = () => {
     }
   };
 
-  const loadSavedPlaylists = async () => {
-    try {
-      const saved = await playlistsService.getSavedPlaylists();
-      setSavedPlaylistIds(new Set(saved.map((p: any) => p.playlist_id)));
-    } catch (error) {
-      console.error('Error loading saved playlists:', error);
-    }
-  };
-
   const handleToggleSave = async (e: React.MouseEvent, playlistId: number) => {
     e.stopPropagation();
     
@@ -14,6 +14,9 @@ const Profile = () => {
   const { toast } = useToast();
   const [user, setUser] = useState<User | null>(authService.getUser());
   const [collections, setCollections] = useState<any[]>([]);
+  const [collectionsCursor, setCollectionsCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [importing, setImporting] = useState(false);
   const [savedPlaylists, setSavedPlaylists] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
   const [profileLoading, setProfileLoading] = useState(true);
@@ -33,7 +36,7 @@ const Profile = () => {
         const [collectionsData, savedPlaylistsData] = await Promise.all([
           collectionsService.getCollections().catch((e) => {
             console.error('Error loading collections:', e);
-            return [];
+            return { items: [], nextCursor: null };
           }),
           playlistsService.getSavedPlaylists().catch((e) => {
             console.error('Error loading saved playlists:', e);
@@ -41,7 +44,8 @@ const Profile = () => {
           })
         ]);
         
-        setCollections(collectionsData);
+        setCollections(collectionsData.items);
+        setCollectionsCursor(collectionsData.nextCursor);
         setSavedPlaylists(savedPlaylistsData);
       } catch (error) {
         console.error('Error loading profile:', error);
@@ -55,8 +59,49 @@ const Profile = () => {
     initProfile();
   }, [navigate]);
 
+  const handleLoadMoreCollections = async () => {
+    if (!collectionsCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await collectionsService.getCollections(collectionsCursor);
+      setCollections((prev) => [...prev, ...page.items]);
+      setCollectionsCursor(page.nextCursor);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const handleImportCollections = async (event: React.ChangeEvent<HTMLInputElement>) => {
+    const file = event.target.files?.[0];
+    event.target.value = '';
+    if (!file) return;
+    setImporting(true);
+    try {
+      const result = await collectionsService.importCsv(file);
+      const [page, profileData] = await Promise.all([
+        collectionsService.getCollections(),
+        authService.getProfile(),
+      ]);
+      setCollections(page.items);
+      setCollectionsCursor(page.nextCursor);
+      setUser(profileData);
+      toast({
+        title: 'Импорт завершён',
+        description: `Добавлено: ${result.imported}, уже были в коллекции: ${result.duplicates}, пропущено строк: ${result.skipped}`,
+      });
+    } catch (error: any) {
+      toast({
+        title: 'Ошибка',
+        description: error.message,
+        variant: 'destructive',
+      });
+    } finally {
+      setImporting(false);
+    }
+  };
+
   const handleProfileUpdate = (updatedUser: User) => {
-    setUser(updatedUser);
+    setUser((prev) => ({ ...updatedUser, stats: updatedUser.stats ?? prev?.stats }));
   };
 
   const handleLogout = () => {
@@ -71,6 +116,9 @@ const Profile = () => {
     try {
       await collectionsService.removeFromCollection(movieId);
       setCollections(collections.filter((c) => c.movie_id !== movieId));
+      setUser((prev) => prev?.stats
+        ? { ...prev, stats: { ...prev.stats, collection_count: Math.max(prev.stats.collection_count - 1, 0) } }
+        : prev);
       toast({
         title: 'Успешно',
         description: 'Фильм удалён из коллекции',
@@ -190,7 +238,9 @@ const Profile = () => {
                       )}
                       <div>
                         <p className="text-sm text-foreground/60 mb-1">Сохранено фильмов</p>
-                        <p className="text-2xl font-bold text-primary">{collections.length}</p>
+                        <p className="text-2xl font-bold text-primary">
+                          {user?.stats ? user.stats.collection_count : `${collections.length}${collectionsCursor ? '+' : ''}`}
+                        </p>
                       </div>
                     </div>
 
@@ -260,7 +310,16 @@ const Profile = () => {
           </div>
 
           <div>
-            <h3 className="text-2xl font-bold mb-6">Моя коллекция фильмов</h3>
+            <div className="flex items-center justify-between mb-6">
+              <h3 className="text-2xl font-bold">Моя коллекция фильмов</h3>
+              <Button variant="outline" className="gap-2" disabled={importing} asChild>
+                <label className="cursor-pointer">
+                  <Icon name={importing ? 'Loader2' : 'Upload'} size={16} className={importing ? 'animate-spin' : ''} />
+                  Импорт CSV
+                  <input type="file" accept=".csv,text/csv" className="hidden" onChange={handleImportCollections} disabled={importing} />
+                </label>
+              </Button>
+            </div>
 
             {loading ? (
               <div className="flex items-center justify-center py-12">
@@ -327,6 +386,15 @@ const Profile = () => {
                 ))}
               </div>
             )}
+
+            {collectionsCursor && (
+              <div className="flex justify-center mt-8">
+                <Button variant="outline" onClick={handleLoadMoreCollections} disabled={loadingMore} className="gap-2">
+                  {loadingMore && <Icon name="Loader2" size={16} className="animate-spin" />}
+                  Показать ещё
+                </Button>
+              </div>
+            )}
           </div>
         </div>
       </div>